@@ -288,6 +288,32 @@ class Program
         }
     }
 
+    /// <summary>
+    /// Runs the benchmark's solvers on the first numAgents agents of a scenario file, appending to the given
+    /// results file and writing its header if it's new. Lets the benchmark run as independent jobs -
+    /// see run_benchmark.py.
+    /// </summary>
+    /// <param name="scenPath"></param>
+    /// <param name="numAgents"></param>
+    /// <param name="resultsFileName"></param>
+    /// <param name="skippedSolvers">Indices of solvers that timed out on fewer agents of the scenario. Like in the
+    /// benchmark's loop, where one Run solves all the agent counts, they aren't run again.</param>
+    public void RunBenchmarkJob(string scenPath, int numAgents, string resultsFileName, int[] skippedSolvers)
+    {
+        Constants.MAX_FAIL_COUNT = 1;  // That's the way the benchmark is run
+        ProblemInstance problem = ProblemInstance.Import(scenPath);
+        using (Run runner = new Run())
+        {
+            foreach (int i in skippedSolvers)
+                runner.outOfTimeCounters[i] = Constants.MAX_FAIL_COUNT;
+            bool resultsFileExisted = File.Exists(resultsFileName);
+            runner.OpenResultsFile(resultsFileName);
+            if (resultsFileExisted == false)
+                runner.PrintResultsFileHeader();
+            runner.SolveGivenProblem(problem.Subproblem(problem.agents.Take(numAgents).ToArray()));
+        }
+    }
+
     /// <summary>
     /// This is the starting point of the program. 
     /// </summary>
@@ -309,6 +335,21 @@ class Program
 
         Program.onlyReadInstances = false;
 
+        int scenArgIndex = Array.IndexOf(args, "--scen");
+        if (scenArgIndex != -1)  // A single benchmark job: --scen <path> --agents <num> --results <path> [--config <CBS options>] [--skip-solvers <i,j,...>]
+        {
+            string scenPath = args[scenArgIndex + 1];
+            int numAgents = int.Parse(args[Array.IndexOf(args, "--agents") + 1]);
+            string resultsFileName = args[Array.IndexOf(args, "--results") + 1];
+            int configArgIndex = Array.IndexOf(args, "--config");
+            if (configArgIndex != -1)  // See Run.ConfiguredCbs
+                Run.solverConfiguration = args[configArgIndex + 1];
+            int skipArgIndex = Array.IndexOf(args, "--skip-solvers");
+            int[] skippedSolvers = skipArgIndex != -1 ? args[skipArgIndex + 1].Split(',').Select(int.Parse).ToArray() : new int[0];
+            me.RunBenchmarkJob(scenPath, numAgents, resultsFileName, skippedSolvers);
+            return;
+        }
+
         int instances = 100;
 
         bool runGrids = false;
@@ -100,6 +100,12 @@ public class Run : IDisposable
     /// </summary>
     public int[] outOfTimeCounters;
 
+    /// <summary>
+    /// When set, the solvers listed in the constructor are replaced by a single CBS configured by it -
+    /// see ConfiguredCbs. Lets sweep.py tune CBS's options without editing the list.
+    /// </summary>
+    public static string solverConfiguration = null;
+
     /// <summary>
     /// Construct with chosen algorithms.
     /// </summary>
@@ -592,6 +598,16 @@ public class Run : IDisposable
         //solvers.Add(new CBS_NoDDb3(new A_Star()));
         //solvers.Add(new MACBS_WholeTreeThreshold(new A_Star(), 1, 1)); // Run this!
 
+        if (solverConfiguration != null)
+        {
+            var lowLevelSolvers = new Dictionary<string, ICbsSolver>() {
+                { "astar", astar }, { "astar_with_od", astar_with_od }, { "epea", epea } };
+            var heuristics = new Dictionary<string, ILazyHeuristic<CbsNode>>() {
+                { "none", null }, { "mvc", mvc }, { "mddPruning", mddPruning } };
+            solvers = new List<ISolver>();
+            solvers.Add(ConfiguredCbs(solverConfiguration, astar, lowLevelSolvers, heuristics));
+        }
+
         outOfTimeCounters = new int[solvers.Count];
         for (int i = 0; i < outOfTimeCounters.Length; i++)
         {
@@ -599,6 +615,98 @@ public class Run : IDisposable
         }
     }
 
+    /// <summary>
+    /// Builds a CBS from comma-separated name=value pairs, like
+    /// "mergeThreshold=5,bypassStrategy=FIRST_FIT_LOOKAHEAD,mergeCausesRestart=true".
+    /// The names are those of the CBS constructor's parameters, and parameters that aren't given keep their defaults.
+    /// lowLevel picks the multi-agent solver by its key in lowLevelSolvers (EPEA* by default), heuristic picks the
+    /// high level heuristic by its key in heuristics, and lookaheadMaxExpansions may be "inf".
+    /// </summary>
+    /// <param name="configuration"></param>
+    /// <param name="singleAgentSolver"></param>
+    /// <param name="lowLevelSolvers"></param>
+    /// <param name="heuristics"></param>
+    /// <returns></returns>
+    public static CBS ConfiguredCbs(string configuration, ICbsSolver singleAgentSolver,
+                                    Dictionary<string, ICbsSolver> lowLevelSolvers,
+                                    Dictionary<string, ILazyHeuristic<CbsNode>> heuristics)
+    {
+        ICbsSolver generalSolver = lowLevelSolvers["epea"];
+        int mergeThreshold = -1;
+        CBS.BypassStrategy bypassStrategy = CBS.BypassStrategy.NONE;
+        bool doMalte = false;
+        CBS.ConflictChoice conflictChoice = CBS.ConflictChoice.FIRST;
+        ILazyHeuristic<CbsNode> heuristic = null;
+        bool disableTieBreakingByMinOpsEstimate = true;
+        int lookaheadMaxExpansions = 1;
+        bool mergeCausesRestart = false;
+        bool replanSameCostWithMdd = false;
+        bool cacheMdds = false;
+        bool useOldCost = false;
+        bool useCAT = true;
+
+        foreach (string pair in configuration.Split(new char[] { ',' }, StringSplitOptions.RemoveEmptyEntries))
+        {
+            string[] nameAndValue = pair.Split('=');
+            if (nameAndValue.Length != 2)
+                throw new ArgumentException($"Bad solver configuration entry \"{pair}\" - expected name=value");
+            string name = nameAndValue[0].Trim();
+            string value = nameAndValue[1].Trim();
+            switch (name)
+            {
+                case "lowLevel":
+                    if (lowLevelSolvers.ContainsKey(value) == false)
+                        throw new ArgumentException($"Unknown low level solver {value}");
+                    generalSolver = lowLevelSolvers[value];
+                    break;
+                case "mergeThreshold":
+                    mergeThreshold = int.Parse(value);
+                    break;
+                case "bypassStrategy":
+                    bypassStrategy = (CBS.BypassStrategy)Enum.Parse(typeof(CBS.BypassStrategy), value, true);
+                    break;
+                case "doMalte":
+                    doMalte = bool.Parse(value);
+                    break;
+                case "conflictChoice":
+                    conflictChoice = (CBS.ConflictChoice)Enum.Parse(typeof(CBS.ConflictChoice), value, true);
+                    break;
+                case "heuristic":
+                    if (heuristics.ContainsKey(value) == false)
+                        throw new ArgumentException($"Unknown high level heuristic {value}");
+                    heuristic = heuristics[value];
+                    break;
+                case "disableTieBreakingByMinOpsEstimate":
+                    disableTieBreakingByMinOpsEstimate = bool.Parse(value);
+                    break;
+                case "lookaheadMaxExpansions":
+                    lookaheadMaxExpansions = value == "inf" ? int.MaxValue : int.Parse(value);
+                    break;
+                case "mergeCausesRestart":
+                    mergeCausesRestart = bool.Parse(value);
+                    break;
+                case "replanSameCostWithMdd":
+                    replanSameCostWithMdd = bool.Parse(value);
+                    break;
+                case "cacheMdds":
+                    cacheMdds = bool.Parse(value);
+                    break;
+                case "useOldCost":
+                    useOldCost = bool.Parse(value);
+                    break;
+                case "useCAT":
+                    useCAT = bool.Parse(value);
+                    break;
+                default:
+                    throw new ArgumentException($"Unknown solver configuration parameter {name}");
+            }
+        }
+
+        return new CBS(singleAgentSolver, generalSolver, mergeThreshold, bypassStrategy, doMalte, conflictChoice,
+                       heuristic, disableTieBreakingByMinOpsEstimate, lookaheadMaxExpansions, mergeCausesRestart,
+                       replanSameCostWithMdd, cacheMdds, useOldCost, useCAT);
+    }
+
     /// <summary>
     /// Generates a problem instance, including a board, start and goal locations of desired number of agents
     /// and desired precentage of obstacles
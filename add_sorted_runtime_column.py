@@ -1,25 +1,133 @@
-import sys
-import os.path
-import csv
-
-input_path = sys.argv[1]
-input_filename = os.path.splitext(input_path)[0]
-output_path = input_filename + ' with analysis' + '.csv'
-
-reader = csv.DictReader(open(input_path))
-
-runtime_fieldnames = [fieldname for fieldname in reader.fieldnames if fieldname.endswith('Runtime') and not fieldname.endswith('Average Runtime')]
-writer_fieldnames = reader.fieldnames
-for i in xrange(len(runtime_fieldnames)):
-    writer_fieldnames += ["%d place" % (i + 1, )]
-
-writer = csv.DictWriter(open(output_path, 'wb'), writer_fieldnames)
-writer.writeheader()
-
-for row in reader:
-    solvers_and_runtimes = [(col_name[:-len(" Runtime")], float(col_val)) for col_name,col_val in row.iteritems() \
-                            if col_name in runtime_fieldnames]
-    solvers_and_runtimes.sort(key=lambda x:x[1])
-    for i in xrange(len(runtime_fieldnames)):
-        row["%d place" % (i + 1, )] = "%s runtime=%f speedup=%f" % (solvers_and_runtimes[i][0], solvers_and_runtimes[i][1], (solvers_and_runtimes[i + 1][1] / solvers_and_runtimes[i][1]) if (i + 1 < len(runtime_fieldnames)) else 1)
-    writer.writerow(row)
+"""
+Rank the solvers of each instance by runtime and compute pairwise speedups.
+
+Usage: add_sorted_runtime_column.py results.csv
+
+Writes "<input> with analysis.csv" - the input with "N place" columns that rank the solvers of each row,
+and "<input> speedups.csv" - the geometric mean speedup of every solver over every other solver,
+overall, per Num Of Agents and per grid.
+
+Only successful runs are ranked by runtime. Failed runs come after them, and solvers that weren't run
+("irrelevant") come last. Speedups are only computed over instances both solvers solved.
+"""
+import os.path
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from results import solver_names, MIN_RUNTIME
+from results_cache import read_table, irrelevant
+
+
+def runtime_matrix(header, table):
+    """Solver names and (rows x solvers) arrays of runtimes, successes and whether each solver was run"""
+    solvers = solver_names(header)
+    runtimes = np.column_stack([pd.to_numeric(table[header.index(f'{solver} Runtime')], errors='coerce')
+                                .to_numpy(dtype=float) for solver in solvers])
+    successes = np.column_stack([pd.to_numeric(table[header.index(f'{solver} Success')], errors='coerce')
+                                 .to_numpy(dtype=float) == 1 for solver in solvers])
+    ran = np.column_stack([pd.to_numeric(table[header.index(f'{solver} Solution Cost')], errors='coerce')
+                           .to_numpy(dtype=float) for solver in solvers])
+    ran = ~np.isnan(ran)
+    return solvers, runtimes, successes & ran, ran
+
+
+def places(solvers, runtimes, successes, ran):
+    """
+    The "N place" columns - the solvers of each row sorted by runtime, each with its speedup over
+    the next one. Sorting is lexicographic by (not run, failed, runtime).
+    """
+    num_rows, num_solvers = runtimes.shape
+    order = np.lexsort((np.nan_to_num(runtimes, nan=np.inf), ~successes, ~ran), axis=-1) if num_rows else \
+        np.empty((0, num_solvers), dtype=int)
+    rows = np.arange(num_rows)[:, np.newaxis]
+    sorted_runtimes = runtimes[rows, order]
+    sorted_successes = successes[rows, order]
+    sorted_ran = ran[rows, order]
+
+    clamped = np.maximum(sorted_runtimes, MIN_RUNTIME)
+    next_runtimes = np.append(clamped[:, 1:], np.ones((num_rows, 1)), axis=1)
+    next_successes = np.append(sorted_successes[:, 1:], np.zeros((num_rows, 1), dtype=bool), axis=1)
+    next_ran = np.append(sorted_ran[:, 1:], np.zeros((num_rows, 1), dtype=bool), axis=1)
+    speedups = np.where(next_successes, next_runtimes / clamped,
+                        np.where(next_ran, np.inf, 1))  # Faster than a failure by more than any ratio we know
+
+    names = np.array(solvers, dtype=object)[order]
+    runtime_text = np.char.mod('%f', np.nan_to_num(sorted_runtimes)).astype(object)
+    speedup_text = np.char.mod('%f', speedups).astype(object)
+    text = np.where(sorted_successes, names + ' runtime=' + runtime_text + ' speedup=' + speedup_text,
+                    np.where(sorted_ran, names + ' runtime=' + runtime_text + ' failed', irrelevant))
+    return pd.DataFrame(text, columns=[f'{i + 1} place' for i in range(num_solvers)])
+
+
+def geometric_mean_speedups(solvers, runtimes, successes):
+    """
+    An (solvers x solvers) matrix of the geometric mean of runtime[baseline] / runtime[solver] over the
+    instances both solved, and a matrix of the number of those instances.
+    Computed with two matrix products instead of a (rows x solvers x solvers) array.
+    """
+    solved = successes.astype(float)
+    log_runtimes = np.where(successes, np.log(np.maximum(np.nan_to_num(runtimes, nan=MIN_RUNTIME), MIN_RUNTIME)), 0)
+    counts = solved.T @ solved
+    log_sums = solved.T @ log_runtimes  # [solver, baseline] = sum of log runtime[baseline] where both solved
+    with np.errstate(invalid='ignore'):
+        speedups = np.exp((log_sums - log_sums.T) / counts)
+    return (pd.DataFrame(speedups, index=solvers, columns=solvers),
+            pd.DataFrame(counts.astype(int), index=solvers, columns=solvers))
+
+
+def speedup_table(solvers, runtimes, successes, grid_names, nums_of_agents):
+    """The geometric mean speedups overall, per Num Of Agents and per grid, one (solver, baseline) pair per row"""
+    groups = [('all', 'all', np.ones(len(runtimes), dtype=bool))]
+    known_nums_of_agents = np.unique(nums_of_agents[~np.isnan(nums_of_agents)]).astype(int)
+    groups += [('all', num, nums_of_agents == num) for num in known_nums_of_agents]
+    groups += [(grid, 'all', grid_names == grid) for grid in pd.unique(grid_names)]
+    parts = []
+    for grid, num_of_agents, mask in groups:
+        speedups, counts = geometric_mean_speedups(solvers, runtimes[mask], successes[mask])
+        part = pd.DataFrame({'Speedup': speedups.stack(), 'Instances': counts.stack()})
+        part.index.names = ['Solver', 'Baseline']
+        part = part.reset_index()
+        part = part[part['Solver'] != part['Baseline']]
+        part.insert(0, 'Num Of Agents', num_of_agents)
+        part.insert(0, 'Grid Name', grid)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def write_with_columns(input_path, output_path, columns):
+    """Copy a results CSV, appending the given columns to each line, without parsing and formatting it again"""
+    suffixes = columns.iloc[:, 0].to_numpy(dtype=object)
+    for position in range(1, len(columns.columns)):
+        suffixes = suffixes + ',' + columns.iloc[:, position].to_numpy(dtype=object)
+    with open(input_path, newline='') as input_file, open(output_path, 'w', newline='') as output_file:
+        output_file.write(next(input_file).rstrip('\r\n') + ',' + ','.join(columns.columns) + '\n')
+        lines = (line.rstrip('\r\n') for line in input_file if line.strip())  # read_table skips blank lines too
+        output_file.writelines(f'{line},{suffix}\n' for line, suffix in zip(lines, suffixes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rank the solvers of each instance and compute pairwise speedups')
+    parser.add_argument('input_path')
+    input_path = parser.parse_args(argv).input_path
+    input_filename = os.path.splitext(input_path)[0]
+
+    header, table = read_table(input_path)
+    solvers, runtimes, successes, ran = runtime_matrix(header, table)
+
+    ranking = places(solvers, runtimes, successes, ran)
+    write_with_columns(input_path, input_filename + ' with analysis' + '.csv', ranking)
+
+    grid_names = table[header.index('Grid Name')].astype(str).to_numpy()
+    nums_of_agents = pd.to_numeric(table[header.index('Num Of Agents')], errors='coerce').to_numpy()
+    speedups = speedup_table(solvers, runtimes, successes, grid_names, nums_of_agents)
+    speedups.to_csv(input_filename + ' speedups' + '.csv', index=False)
+
+    overall, _ = geometric_mean_speedups(solvers, runtimes, successes)
+    print('Geometric mean speedup of each solver (row) over each baseline (column):')
+    print(overall.round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+A persisted aggregate cube of a results CSV, that can be kept up to date while Run.cs is still appending to it.
+
+Usage: aggregate_cube.py Results.csv [--by "Grid Name" "Num Of Agents"] [--metric Runtime]
+                          [--where "Grid Name=den520d"]
+       aggregate_cube.py Results.csv --follow [--interval 10]
+
+The cube has a cell per (Grid Name, Scenario Type, Num Of Agents, Solver). Each cell holds the number of runs and
+successes, and for every metric, the count, sum and sum of squares of its values on the successful runs - enough
+to answer the success rate, mean and standard deviation of any slice of the cube by adding cells up, without
+reading the rows again. The scenario type is taken from .scen instance names like "den520d-random-3.scen".
+
+The cube is saved next to the CSV with the byte offset it has read up to. Updating it only reads the rows
+appended since, and a partly written last row is left for the next update. With --follow, the cube is updated and
+the slice printed every few seconds. If the CSV's header changed or it was truncated, the cube is rebuilt. So is it
+if the CSV was replaced by a new one - say, deleted and run again - which is told by the file's inode and a hash of
+the bytes just before the saved offset, since the new file soon grows past it and usually has the same header.
+"""
+import io
+import os
+import json
+import hashlib
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from results import _parse_table, _per_solver, metric_names
+from results_cache import read_header, irrelevant
+
+CUBE_SUFFIX = '.cube.npz'
+FORMAT_VERSION = 2
+key_names = ['Grid Name', 'Scenario Type', 'Num Of Agents', 'Solver']
+_BLOCK_SIZE = 64 * 1024 * 1024
+_FINGERPRINT_SIZE = 4096
+
+
+def scenario_type(instance_name):
+    """The scenario type of a .scen instance name like "den520d-random-3.scen", or "" for other instances"""
+    if not instance_name.endswith('.scen'):
+        return ''
+    parts = instance_name[:-len('.scen')].split('-')
+    return parts[-2] if len(parts) >= 3 else ''
+
+
+def cell_sums(data):
+    """The cube cells of parsed results (see results.read_results), as a DataFrame indexed by key_names"""
+    keys = data.index.to_frame(index=False)
+    by = [keys['Grid Name'].astype(str).to_numpy(),
+          np.array([scenario_type(str(name)) for name in keys['Instance Name']], dtype=object),
+          keys['Num Of Agents'].to_numpy()]
+    ran = data['Ran'].astype(bool)
+    succeeded = data['Success'].astype(bool) & ran
+    values = data[metric_names(data)].astype(np.float64)
+    solved_values = values.where(_per_solver(succeeded, values.columns))
+
+    fields = {'Runs': ran.groupby(by).sum(), 'Successes': succeeded.groupby(by).sum()}
+    grouped = solved_values.groupby(by)
+    totals = {'Count': grouped.count(), 'Sum': grouped.sum(), 'Sum Of Squares': (solved_values ** 2).groupby(by).sum()}
+    columns = {name: frame.stack(future_stack=True) for name, frame in fields.items()}
+    for kind, frame in totals.items():
+        long = frame.stack('solver', future_stack=True)
+        for metric in long.columns:
+            columns[f'{metric} {kind}'] = long[metric]
+    cells = pd.DataFrame(columns).fillna(0)
+    cells.index.names = key_names
+    return cells[cells['Runs'] > 0]
+
+
+class Cube:
+    def __init__(self, cells=None, state=None):
+        self.cells = cells if cells is not None else pd.DataFrame(index=pd.MultiIndex.from_tuples([], names=key_names))
+        self.state = state or {}
+
+    def add(self, cells):
+        self.cells = self.cells.add(cells, fill_value=0).fillna(0)
+
+    def save(self, path):
+        keys = self.cells.index.to_frame(index=False)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, values=self.cells.to_numpy(dtype=np.float64), columns=np.array(self.cells.columns, dtype=str),
+                     **{f'key {name}': keys[name].to_numpy(dtype=str if name != 'Num Of Agents' else np.int64)
+                        for name in key_names},
+                     state=np.array(json.dumps({**self.state, 'version': FORMAT_VERSION})))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """The saved cube, or None if there's none or it's from another version"""
+        try:
+            with np.load(path) as saved:
+                state = json.loads(str(saved['state']))
+                if state.get('version') != FORMAT_VERSION:
+                    return None
+                index = pd.MultiIndex.from_arrays([saved[f'key {name}'] for name in key_names], names=key_names)
+                cells = pd.DataFrame(saved['values'], index=index, columns=list(saved['columns']))
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(cells, state)
+
+    def slice(self, by, where=None):
+        """
+        Success rates, means and standard deviations of every metric per solver and the given keys,
+        over the cells matching the where dict of key names to values
+        """
+        cells = self.cells
+        for name, value in (where or {}).items():
+            level = cells.index.get_level_values(name)
+            cells = cells[level.astype(str) == str(value)]
+        totals = cells.groupby(level=list(by) + ['Solver'], sort=True).sum()
+        result = pd.DataFrame({'Runs': totals['Runs'].astype(np.int64),
+                               'Success Rate': totals['Successes'] / totals['Runs']})
+        for column in totals.columns:
+            if column.endswith(' Count'):
+                metric = column[:-len(' Count')]
+                counts = totals[column].where(totals[column] > 0)
+                means = totals[f'{metric} Sum'] / counts
+                variances = (totals[f'{metric} Sum Of Squares'] - totals[f'{metric} Sum'] * means) / (counts - 1)
+                result[f'{metric} Mean'] = means
+                result[f'{metric} Std'] = np.sqrt(variances.clip(lower=0))
+        return result
+
+
+def _new_rows(path, header, offset):
+    """Yield DataFrames of the complete rows after the given byte offset, with the offset after each"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        leftover = b''
+        while True:
+            block = f.read(_BLOCK_SIZE)
+            if not block:
+                return
+            block = leftover + block
+            end = block.rfind(b'\n') + 1
+            leftover = block[end:]
+            if end == 0:
+                continue
+            offset += end
+            lines = block[:end]
+            if lines.strip():
+                raw = pd.read_csv(io.BytesIO(lines), header=None, names=range(len(header)), na_values=[irrelevant],
+                                  dtype=str, low_memory=False, skip_blank_lines=True)
+                yield raw, offset
+            else:
+                yield None, offset
+
+
+def _fingerprint(path, offset):
+    """A hash of the bytes of the file just before the given offset, which the cube has already read"""
+    with open(path, 'rb') as f:
+        start = max(0, offset - _FINGERPRINT_SIZE)
+        f.seek(start)
+        return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+
+def _is_same_file(state, path, header):
+    """Whether the results CSV is still the one the cube with the given state was read from"""
+    offset = state.get('offset', 0)
+    return (state.get('header') == header and offset <= os.path.getsize(path) and
+            state.get('inode') == os.stat(path).st_ino and state.get('fingerprint') == _fingerprint(path, offset))
+
+
+def update(path, cube_path=None):
+    """
+    Fold the rows appended to the results CSV since the cube was last updated into its cube, building it if needed.
+    Returns the cube and the number of rows read.
+    """
+    cube_path = cube_path or path + CUBE_SUFFIX
+    header = read_header(path)
+    cube = Cube.load(cube_path)
+    if cube is None or not _is_same_file(cube.state, path, header):
+        with open(path, 'rb') as f:
+            header_length = len(f.readline())
+        cube = Cube(state={'header': header, 'offset': header_length})
+    num_rows = 0
+    for raw, offset in _new_rows(path, header, cube.state['offset']):
+        if raw is not None:
+            data = _parse_table(header, raw)
+            cube.add(cell_sums(data))
+            num_rows += len(raw)
+        cube.state['offset'] = offset
+    if num_rows or not os.path.exists(cube_path) or 'fingerprint' not in cube.state:
+        cube.state['inode'] = os.stat(path).st_ino
+        cube.state['fingerprint'] = _fingerprint(path, cube.state['offset'])
+        cube.save(cube_path)
+    return cube, num_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep an aggregate cube of a results CSV and print slices of it')
+    parser.add_argument('results')
+    parser.add_argument('--cube', default=None, help=f'Where the cube is kept (default: the CSV path + {CUBE_SUFFIX})')
+    parser.add_argument('--by', nargs='*', default=['Num Of Agents'], choices=key_names[:-1],
+                        help='The keys to slice by, besides the solver')
+    parser.add_argument('--where', nargs='*', default=[], help='Filters like "Grid Name=den520d"')
+    parser.add_argument('--metric', nargs='*', default=['Runtime'], help='Metrics to print')
+    parser.add_argument('--follow', action='store_true', help='Keep updating as rows are appended')
+    parser.add_argument('--interval', type=float, default=10, help='Seconds between updates with --follow')
+    args = parser.parse_args()
+    where = dict(condition.split('=', 1) for condition in args.where)
+
+    while True:
+        cube, num_rows = update(args.results, args.cube)
+        table = cube.slice(args.by, where)
+        columns = ['Runs', 'Success Rate'] + [f'{metric} {kind}' for metric in args.metric for kind in ('Mean', 'Std')
+                                             if f'{metric} {kind}' in table.columns]
+        print(f'{num_rows} new rows')
+        with pd.option_context('display.width', 200, 'display.max_rows', None):
+            print(table[columns].to_string(float_format='{:,.2f}'.format))
+        if not args.follow:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+A single, fast-starting entry point for the analysis scripts.
+
+Usage: analysis.py tables Results.csv ... [--table METRIC]
+       analysis.py plots Results.csv ... [--per-grid] [--format pdf]
+       analysis.py split Results.csv --by grid
+       analysis.py rank Results.csv
+       analysis.py harvest "mdd-sat dao" -o mdd-sat-dao.csv
+       analysis.py batch [--separator ---] < jobs.txt
+
+Each subcommand runs the main() of the script it's built on with the rest of the arguments, so it takes the same
+options - see "analysis.py <subcommand> --help". Only the standard library is imported up front. pandas and NumPy
+are imported by the script of the subcommand that runs, and matplotlib only when drawing figures.
+
+The output of tables is cached in a .analysis-cache directory next to its first input, keyed by its arguments and
+by the size and modification time of its input files and of the scripts it runs - so editing, say, the solver order
+in runtimes_and_successes.py prints new tables. Printing the tables of unchanged results again just copies the
+cached output, without importing pandas or reading the results at all.
+
+batch reads a subcommand's command line from each line of stdin, in shell quoting, and runs them one after the
+other in the same process, so the imports are paid for once. A failed job is reported on stderr and the batch goes
+on. With --separator, the given line is printed after the output of each job.
+"""
+# Only cheap modules are imported up front - json and shlex (with re) would take a good part of the startup time
+import os
+import sys
+import hashlib
+import importlib
+
+CACHE_DIRNAME = '.analysis-cache'
+FORMAT_VERSION = 1
+
+# Subcommand name: (module, keyword arguments for its main, description)
+commands = {
+    'tables': ('runtimes_and_successes', {'plots': False}, 'Print success rates and averages, also as TeX tables'),
+    'plots': ('runtimes_and_successes', {'tables': False}, 'Draw the figures of the report'),
+    'split': ('split_results', {}, 'Split a results CSV by any combination of keys'),
+    'rank': ('add_sorted_runtime_column', {}, 'Rank the solvers of each instance and compute pairwise speedups'),
+    'harvest': ('harvest', {}, 'Harvest MDD-SAT output files into a results CSV'),
+}
+# Subcommand name: the modules its output depends on, besides its input files
+cached_commands = {'tables': ['runtimes_and_successes', 'results', 'results_cache']}
+
+
+def usage():
+    lines = ['usage: analysis.py {' + ','.join(list(commands) + ['batch']) + '} ...', '']
+    lines += [f'  {name:<8} {description}' for name, (_, _, description) in commands.items()]
+    lines.append(f'  {"batch":<8} Run the command lines read from stdin')
+    return '\n'.join(lines)
+
+
+def cache_path(name, args):
+    """Where the output of a command line is cached, or None if it has no input files"""
+    inputs = [os.path.abspath(arg) for arg in args if os.path.isfile(arg)]
+    if not inputs:
+        return None
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    code = [os.path.join(code_dir, module_name + '.py') for module_name in cached_commands[name]]
+    stats = [(path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in inputs + code]
+    key = repr((FORMAT_VERSION, name, [os.path.abspath(arg) if os.path.isfile(arg) else arg for arg in args], stats))
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return os.path.join(os.path.dirname(inputs[0]), CACHE_DIRNAME, f'{name}-{digest}.txt')
+
+
+def _run_cached(name, args, run):
+    path = cache_path(name, args)
+    if path is not None and os.path.exists(path):
+        with open(path) as f:
+            sys.stdout.write(f.read())
+        return
+    import tempfile
+    # Capture the output at the file descriptor, so the output of worker processes - which write to their own
+    # copies of stdout - is cached too, in the order it was written
+    with tempfile.TemporaryFile() as capture:
+        sys.stdout.flush()
+        stdout_fd = os.dup(1)
+        os.dup2(capture.fileno(), 1)
+        try:
+            run()
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                path = None
+            raise
+        except BaseException:
+            path = None
+            raise
+        finally:
+            sys.stdout.flush()
+            os.dup2(stdout_fd, 1)
+            os.close(stdout_fd)
+            capture.seek(0)
+            output = capture.read().decode(errors='replace')
+            sys.stdout.write(output)
+            if path is not None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f'{path}.{os.getpid()}.tmp'
+                with open(temp_path, 'w') as f:
+                    f.write(output)
+                os.replace(temp_path, path)
+
+
+def run(argv):
+    """Run a subcommand's command line, given as a list of arguments"""
+    name, args = argv[0], argv[1:]
+    if name not in commands:
+        raise SystemExit(f'Unknown subcommand "{name}"\n{usage()}')
+    module_name, kwargs, _ = commands[name]
+
+    def run_main():
+        importlib.import_module(module_name).main(args, **kwargs)
+
+    if name in cached_commands and not {'-h', '--help'} & set(args):
+        _run_cached(name, args, run_main)
+    else:
+        run_main()
+
+
+def batch(lines, separator=None):
+    """Run a command line from each of the given lines. Returns the number of jobs that failed."""
+    import shlex
+    import traceback
+    failed = 0
+    for number, line in enumerate(lines, 1):
+        try:
+            argv = shlex.split(line, comments=True)
+            if not argv:
+                continue
+            run(argv)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                failed += 1
+                if isinstance(e.code, str):
+                    print(e.code, file=sys.stderr)
+                print(f'Job {number} failed: {line.strip()}', file=sys.stderr)
+        except Exception:
+            failed += 1
+            traceback.print_exc()
+            print(f'Job {number} failed: {line.strip()}', file=sys.stderr)
+        if separator is not None:
+            print(separator)
+        sys.stdout.flush()
+    return failed
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        sys.exit(0 if argv else 2)
+    if argv[0] == 'batch':
+        import argparse
+        parser = argparse.ArgumentParser(prog='analysis.py batch', description='Run the command lines read from stdin')
+        parser.add_argument('--separator', default=None, help='A line to print after the output of each job')
+        args = parser.parse_args(argv[1:])
+        sys.exit(1 if batch(sys.stdin, args.separator) else 0)
+    run(argv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Compare the results of a candidate build of the solvers with a baseline, on the same instances.
+
+Usage: compare_results.py baseline.csv candidate.csv [--threshold 1.05] [--alpha 0.05] [-o comparison.csv]
+
+Instances are matched by their Grid Name, Instance Name, Num Of Agents and Instance Id. For each solver, on the
+instances both runs solved, the candidate's runtime is divided by the baseline's. The ratios are summarized by
+their geometric mean, with a bootstrap confidence interval, and a Wilcoxon signed-rank test of whether the log
+ratios are centered at zero. Throughput metrics - like expanded nodes per second - are compared the same way, so a
+change that makes nodes cheaper but the search larger shows up as such. Instances the baseline solved and the
+candidate didn't are counted as new failures.
+
+Comparisons are made per solver, per solver and map, per solver and number of agents, and per solver, map and
+number of agents. A comparison is a regression when its geometric mean runtime ratio is above the threshold and
+the test's p-value is below alpha, or when there are more new failures than allowed. The exit status is 1 if
+there's any regression.
+"""
+import sys
+import math
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from results import read_results, MIN_RUNTIME
+
+throughput_metrics = ['Expanded (HL)', 'Generated (HL)']  # Reported per second of runtime
+
+
+def wilcoxon_signed_rank(differences):
+    """
+    The two-sided p-value of the Wilcoxon signed-rank test that the differences are symmetric around zero, by the
+    normal approximation with the tie correction. Zero differences are dropped, as in Wilcoxon's original test.
+    """
+    differences = np.asarray(differences, dtype=np.float64)
+    differences = differences[differences != 0]
+    n = len(differences)
+    if n == 0:
+        return 1.0
+    magnitudes = np.abs(differences)
+    order = np.argsort(magnitudes, kind='stable')
+    sorted_magnitudes = magnitudes[order]
+    # Average ranks of tied magnitudes
+    starts = np.flatnonzero(np.diff(sorted_magnitudes, prepend=-np.inf) != 0)
+    ends = np.append(starts[1:], n)
+    tie_sizes = ends - starts
+    ranks = np.empty(n)
+    ranks[order] = np.repeat((starts + ends + 1) / 2, tie_sizes)
+    positive_sum = ranks[differences > 0].sum()
+    mean = n * (n + 1) / 4
+    variance = n * (n + 1) * (2 * n + 1) / 24 - (tie_sizes ** 3 - tie_sizes).sum() / 48
+    if variance <= 0:
+        return 1.0
+    z = (abs(positive_sum - mean) - 0.5) / math.sqrt(variance)  # With a continuity correction
+    return min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+def bootstrap_interval(values, confidence=0.95, resamples=2000, rng=None):
+    """A percentile bootstrap confidence interval of the mean of the values"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return np.nan, np.nan
+    rng = rng if rng is not None else np.random.default_rng(0)
+    means = np.empty(resamples)
+    chunk_size = max(1, 2 ** 22 // len(values))  # Resample a few million values at a time
+    for start in range(0, resamples, chunk_size):
+        count = min(chunk_size, resamples - start)
+        means[start:start + count] = values[rng.integers(len(values), size=(count, len(values)))].mean(axis=1)
+    return tuple(np.quantile(means, [(1 - confidence) / 2, (1 + confidence) / 2]))
+
+
+def paired(baseline, candidate):
+    """The baseline and candidate results of the instances in both, without duplicate instances"""
+    baseline = baseline[~baseline.index.duplicated(keep='last')]
+    candidate = candidate[~candidate.index.duplicated(keep='last')]
+    common = baseline.index.intersection(candidate.index)
+    return baseline.loc[common], candidate.loc[common]
+
+
+def comparison_rows(baseline, candidate, solver, confidence=0.95, resamples=2000):
+    """One row of comparisons of the given solver for each group of instances, as (group by, group, row) tuples"""
+    both_ran = baseline['Ran', solver] & candidate['Ran', solver]
+    both_solved = both_ran & baseline['Success', solver] & candidate['Success', solver]
+    new_failures = both_ran & baseline['Success', solver] & ~candidate['Success', solver]
+    new_successes = both_ran & ~baseline['Success', solver] & candidate['Success', solver]
+    log_ratios = (np.log(np.maximum(candidate['Runtime', solver], MIN_RUNTIME)) -
+                  np.log(np.maximum(baseline['Runtime', solver], MIN_RUNTIME)))
+    throughputs = {}
+    for metric in throughput_metrics:
+        if (metric, solver) in baseline.columns and (metric, solver) in candidate.columns:
+            candidate_throughput = (np.maximum(candidate[metric, solver], 1) /
+                                    np.maximum(candidate['Runtime', solver], MIN_RUNTIME))
+            baseline_throughput = (np.maximum(baseline[metric, solver], 1) /
+                                   np.maximum(baseline['Runtime', solver], MIN_RUNTIME))
+            throughputs[metric] = np.log(candidate_throughput) - np.log(baseline_throughput)
+
+    keys = baseline.index.to_frame(index=False)
+    groupings = [('all', np.zeros(len(keys), dtype=int), ['all'])]
+    for level in ('Grid Name', 'Num Of Agents'):
+        codes, uniques = pd.factorize(keys[level], sort=True)
+        groupings.append((level, codes, list(uniques)))
+    # A regression on one map at some numbers of agents can be diluted in both of the groupings above
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(keys[['Grid Name', 'Num Of Agents']]), sort=True)
+    groupings.append(('Grid Name, Num Of Agents', codes,
+                      [f'{grid_name}, {num_of_agents}' for grid_name, num_of_agents in uniques]))
+    rng = np.random.default_rng(0)
+    for group_by, codes, names in groupings:
+        for code, name in enumerate(names):
+            in_group = codes == code
+            solved = log_ratios[both_solved.to_numpy() & in_group].to_numpy()
+            low, high = bootstrap_interval(solved, confidence, resamples, rng)
+            row = {
+                'Solver': solver, 'Group By': group_by, 'Group': name,
+                'Both Ran': int(both_ran[in_group].sum()), 'Both Solved': len(solved),
+                'New Failures': int(new_failures[in_group].sum()), 'New Successes': int(new_successes[in_group].sum()),
+                'Runtime Ratio': np.exp(solved.mean()) if len(solved) else np.nan,
+                'Ratio CI Low': np.exp(low), 'Ratio CI High': np.exp(high),
+                'p-value': wilcoxon_signed_rank(solved),
+            }
+            for metric, ratios in throughputs.items():
+                solved_ratios = ratios[both_solved.to_numpy() & in_group].to_numpy()
+                row[f'{metric} Per Second Ratio'] = np.exp(solved_ratios.mean()) if len(solved_ratios) else np.nan
+            yield row
+
+
+def compare(baseline, candidate, confidence=0.95, resamples=2000):
+    """A DataFrame of comparisons of every solver in both parsed results, per group of instances"""
+    baseline, candidate = paired(baseline, candidate)
+    solvers = [solver for solver in baseline['Success'].columns if solver in candidate['Success'].columns]
+    return pd.DataFrame([row for solver in solvers
+                         for row in comparison_rows(baseline, candidate, solver, confidence, resamples)])
+
+
+def regressions(comparison, threshold, alpha, max_new_failures=None, min_instances=10):
+    """Which rows of a comparison are regressions"""
+    slower = ((comparison['Runtime Ratio'] > threshold) & (comparison['p-value'] < alpha) &
+              (comparison['Both Solved'] >= min_instances))
+    if max_new_failures is None:
+        return slower
+    return slower | (comparison['New Failures'] > max_new_failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare a candidate run of the solvers with a baseline run')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=1.05,
+                        help='The geometric mean runtime ratio above which a significant slowdown is a regression')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Significance level of the paired test')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Of the bootstrap confidence intervals')
+    parser.add_argument('--resamples', type=int, default=2000, help='Bootstrap resamples')
+    parser.add_argument('--max-new-failures', type=int, default=None,
+                        help='Instances the baseline solved that the candidate may fail (default: not checked)')
+    parser.add_argument('--min-instances', type=int, default=10,
+                        help='Fewer instances solved by both runs are too few to call a regression')
+    parser.add_argument('-o', '--output', default=None, help='A CSV to write the comparisons to')
+    args = parser.parse_args()
+
+    comparison = compare(read_results(args.baseline), read_results(args.candidate), args.confidence, args.resamples)
+    if comparison.empty:
+        print('No solver was run in both files')
+        return
+    comparison['Regression'] = regressions(comparison, args.threshold, args.alpha, args.max_new_failures,
+                                           args.min_instances)
+    if args.output is not None:
+        comparison.to_csv(args.output, index=False)
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_rows', None):
+        print(comparison[comparison['Group By'] == 'all'].drop(columns=['Group By', 'Group']).to_string(
+            index=False, float_format='{:.3f}'.format))
+        regressed = comparison[comparison['Regression']]
+        if not regressed.empty:
+            print(f'\n{len(regressed)} regressions:')
+            print(regressed[['Solver', 'Group By', 'Group', 'Both Solved', 'New Failures', 'Runtime Ratio',
+                             'Ratio CI Low', 'Ratio CI High', 'p-value']].to_string(index=False,
+                                                                                    float_format='{:.3f}'.format))
+            sys.exit(1)
+    print('\nNo regressions')
+
+
+if __name__ == '__main__':
+    main()
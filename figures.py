@@ -0,0 +1,237 @@
+"""
+Headless rendering of the figures of runtimes_and_successes.py.
+
+A figure is described by a spec: a dict of plain lists, numbers and strings with its title, its panels, the series
+they plot and its style. Specs are drawn on the Agg backend with matplotlib's object API, without pyplot's global
+state, so they can be drawn in a pool of worker processes straight to PNG, PDF or SVG files.
+
+The hash of every output's spec and format is kept in the output directory's figures.json. An output whose file
+exists and whose hash is unchanged isn't drawn again, so re-running a report only draws the figures whose data or
+style changed.
+"""
+import os
+import re
+import json
+import hashlib
+import itertools
+import multiprocessing
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+FORMAT_VERSION = 1  # Bump when the drawing changes in a way the specs don't show
+INDEX_FILENAME = 'figures.json'
+
+styles = {
+    'normal': {
+        'rc': {},
+        'size': [6.4, 4.8],  # Per panel
+        'markers': ['D', 'o', '*', 'x', 'H', 's', 'v'],
+        'line': {},
+        'label': {},
+        'legend': {'fontsize': 'x-small'},
+        'legend title': {},
+    },
+    'big': {
+        'rc': {'font.size': 22},
+        'size': [12.8, 9.6],
+        'markers': ['D', 'o', 's', 'v', '*'],
+        'line': {'linewidth': 4, 'markersize': 15},  # The defaults are 1 and 6
+        'label': {'fontsize': 'x-large'},
+        'legend': {'shadow': True, 'fancybox': True, 'title': 'Solvers'},
+        'legend title': {'fontsize': 'x-large', 'fontweight': 'bold'},
+    },
+}
+
+
+def file_name(text):
+    """A file name made of the given text, without characters that aren't safe in paths"""
+    return re.sub(r'[^\w.-]+', '-', text).strip('-')
+
+
+def _values(frame, solver, agents, scale=1.0):
+    """A solver's column of a (num of agents x solvers) frame as a list, with NaN where it's missing"""
+    if frame is None or solver not in frame.columns:
+        return [np.nan] * len(agents)
+    return [value * scale for value in frame[solver].reindex(agents).to_numpy(dtype=np.float64).tolist()]
+
+
+def _nonzero(values):
+    """Whether any of the values is a number other than 0"""
+    return bool(np.nan_to_num(np.array(values, dtype=np.float64)).any())
+
+
+def _line(label, values):
+    return {'label': label, 'y': values}
+
+
+def _panel(title, ylabel, lines, legend='upper left', ylim=None):
+    return {'title': title, 'xlabel': 'Number Of Agents', 'ylabel': ylabel, 'lines': lines, 'legend': legend,
+            'ylim': ylim}
+
+
+def _spec(name, title, agents, panels, style='normal'):
+    return {'name': name, 'title': title, 'agents': agents, 'panels': panels, 'style': styles[style]}
+
+
+def report_specs(aggregates, solvers, title='', extra_metrics=(), prefix=''):
+    """
+    The specs of the figures of a report on the given results.Aggregates, with a line per solver in the given order.
+    extra_metrics are metrics to plot the averages of in figures of their own. The names of the specs, which name
+    their files, start with the prefix.
+    """
+    agents = sorted(int(num_of_agents) for num_of_agents in aggregates.success_rates.index)
+
+    def means(metric):
+        return aggregates.means[metric] if metric in aggregates.metrics else None
+
+    def lines(frame, suffix='', scale=1.0):
+        return [_line(solver + suffix, _values(frame, solver, agents, scale)) for solver in solvers]
+
+    success_rates = lines(aggregates.success_rates, scale=100)
+    runtimes = means('Runtime')
+
+    generated_and_lookaheads = []
+    for solver in solvers:
+        generated = _values(means('Generated (HL)'), solver, agents)
+        generated_and_lookaheads.append(_line(solver + ' generated nodes', generated))
+        lookaheads = _values(means('Look Ahead Nodes Created (HL)'), solver, agents)
+        if _nonzero(lookaheads):  # Don't plot lookaheads for algorithms that never look ahead
+            generated_and_lookaheads.append(_line(solver + ' generated + lookahead nodes',
+                                                  [g + l for g, l in zip(generated, lookaheads)]))
+
+    def adoption_lines(metric, suffix):
+        # + 1 to make a log scale work
+        return [_line(solver + suffix, [value + 1 for value in values]) for solver in solvers
+                for values in [_values(means(metric), solver, agents)] if _nonzero(values)]
+
+    expanded = []
+    for solver in solvers:
+        expanded.append(_line(solver + ' expanded nodes', _values(means('Expanded (HL)'), solver, agents)))
+        expanded.append(_line(solver + ' nodes expanded with goal cost',
+                              _values(means('Nodes Expanded With Goal Cost (HL)'), solver, agents)))
+
+    specs = [
+        _spec('success-rates-and-runtimes', title, agents, [
+            _panel('Success Rates', 'Success Rate (%)', success_rates, 'lower left', ylim=[0, 105]),
+            _panel('Average Runtimes', 'Average Runtime (ms)', lines(runtimes), ylim=[0, None]),
+        ]),
+        _spec('generated-and-lookahead', title, agents, [
+            _panel('Average Generated and lookahead High Level Nodes', 'Average Number Of High Level Nodes',
+                   generated_and_lookaheads),
+        ]),
+        _spec('adoptions', '', agents, [
+            _panel('Average Number Of Adoptions', 'Average Adoptions', adoption_lines('Adoptions (HL)', ' adoptions')),
+            _panel('Conflicts Solved With Adoption', 'Average Conflicts Solved',
+                   adoption_lines('Conflicts Bypassed With Adoption (HL)', ' conflicts solved with adoption')),
+        ]),
+        _spec('expanded', title, agents, [
+            _panel('Average Expanded High Level Nodes', 'Average Number Of High Level Nodes', expanded),
+        ]),
+        _spec('success-rates-big', '', agents, [
+            _panel('', 'Success Rate (%)', success_rates, 'lower left', ylim=[0, 105]),
+        ], style='big'),
+        _spec('runtimes-big', '', agents, [
+            _panel('', 'Average Runtime (s)', lines(runtimes, scale=1 / 1000), legend=None),
+        ], style='big'),
+        _spec('mdds-built-big', '', agents, [
+            _panel('', 'Average MDDs built', lines(means('MDDs Built (HL)'))),
+        ], style='big'),
+    ]
+    for metric in extra_metrics:
+        specs.append(_spec(f'average-{file_name(metric)}', title, agents, [
+            _panel(f'Average {metric}', f'Average {metric}', lines(means(metric))),
+        ]))
+    for spec in specs:
+        spec['name'] = prefix + spec['name']
+    return specs
+
+
+def spec_hash(spec, output_format):
+    text = json.dumps([FORMAT_VERSION, matplotlib.__version__, output_format, spec], sort_keys=True)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def draw(spec, path, output_format):
+    """Draw a spec into a file in the given format"""
+    style = spec['style']
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with matplotlib.rc_context(style['rc']):
+        panels = spec['panels']
+        figure = Figure(figsize=(style['size'][0] * len(panels), style['size'][1]))
+        FigureCanvasAgg(figure)
+        if spec['title']:
+            figure.suptitle(spec['title'], size='x-large')
+        for i, panel in enumerate(panels, 1):
+            axes = figure.add_subplot(1, len(panels), i)
+            markers = itertools.cycle(style['markers'])
+            for line in panel['lines']:
+                axes.plot(spec['agents'], line['y'], next(markers) + '-', label=line['label'], **style['line'])
+            if panel['title']:
+                axes.set_title(panel['title'])
+            axes.set_xlabel(panel['xlabel'], **style['label'])
+            axes.set_ylabel(panel['ylabel'], **style['label'])
+            if panel['ylim'] is not None:
+                axes.set_ylim(*panel['ylim'])
+            if panel['legend'] is not None and panel['lines']:
+                legend = axes.legend(loc=panel['legend'], **style['legend'])
+                legend.get_title().set(**style['legend title'])
+        figure.savefig(temp_path, format=output_format, bbox_inches='tight')
+    os.replace(temp_path, path)
+
+
+def _draw_task(task):
+    spec, path, output_format, filename, key = task
+    draw(spec, path, output_format)
+    return filename, key
+
+
+def _read_index(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(path, index):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def render(specs, output_dir, output_formats=('png',), processes=None, force=False):
+    """
+    Draw the specs into <output_dir>/<spec name>.<format> files in a pool of processes, skipping the outputs whose
+    spec and format haven't changed since they were drawn, unless forced.
+    Returns the numbers of outputs drawn and skipped.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    index_path = os.path.join(output_dir, INDEX_FILENAME)
+    index = _read_index(index_path)
+    tasks = []
+    skipped = 0
+    for spec in specs:
+        for output_format in output_formats:
+            filename = f"{spec['name']}.{output_format}"
+            path = os.path.join(output_dir, filename)
+            key = spec_hash(spec, output_format)
+            if not force and index.get(filename) == key and os.path.exists(path):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tasks.append((spec, path, output_format, filename, key))
+
+    if processes is None:
+        processes = min(len(tasks), os.cpu_count())
+    if processes <= 1:
+        index.update(map(_draw_task, tasks))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            index.update(pool.imap_unordered(_draw_task, tasks))
+    _write_index(index_path, index)
+    return len(tasks), skipped
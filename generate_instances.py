@@ -0,0 +1,267 @@
+"""
+Generate many problem instances at once, with every agent's goal reachable from its start.
+
+Usage: generate_instances.py --map maps/den520d.map --agents 10 20 50 --instances 1000 [--format scen]
+       generate_instances.py --grid-size 8 --obstacles 15 --agents 5 --instances 100000
+
+Like Program.cs, instances are either on a map file, named "<map name>-<agents>-<i>", or on random square grids
+with a given percentage of obstacles, named "Instance-<grid size>-<obstacles>-<agents>-<i>". They're written in the
+combined instance format of ProblemInstance.Export, or for maps, in the .scen format, one .scen file per instance.
+
+Instead of placing agents one at a time with retries, the connected components of a grid are labeled once, and the
+starts and goals of all instances are drawn together from the grid's largest component, so every goal is reachable.
+Starts are distinct, and so are goals. With --distance-bins, the instances of a map are spread evenly between the
+bins, and all the agents of an instance have a start-goal distance in its bin. That uses the map's goal-distance
+table (see goal_distances.py), which is computed the first time it's needed.
+"""
+import os
+import os.path
+import csv
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from maps import load_grid
+from goal_distances import compute_table
+
+instances_dir = os.path.join('..', '..', '..', 'Instances')  # Where ProblemInstance.Export writes
+formats = ['instance', 'scen']
+
+
+def label_components(obstacles):
+    """
+    Label the 4-connected components of a batch of grids, given as a (grids x rows x columns) boolean array of
+    obstacles. Each free cell is labeled with the smallest flat index of a cell in its component, obstacles with -1.
+    """
+    shape = obstacles.shape
+    free = ~obstacles
+    none = obstacles.size  # Larger than any label
+    labels = np.where(free, np.arange(obstacles.size).reshape(shape), none)
+    while True:
+        previous = labels
+        padded = np.pad(labels, [(0, 0), (1, 1), (1, 1)], constant_values=none)
+        smallest = np.minimum.reduce([labels, padded[:, :-2, 1:-1], padded[:, 2:, 1:-1],
+                                      padded[:, 1:-1, :-2], padded[:, 1:-1, 2:]])
+        labels = np.where(free, smallest, none)
+        flat = labels.ravel()
+        # Point each cell at its label's label until they agree, which merges chains of labels quickly
+        while True:
+            jumped = np.where(flat < none, np.append(flat, none)[np.minimum(flat, none)], none)
+            if np.array_equal(jumped, flat):
+                break
+            flat = jumped
+        labels = flat.reshape(shape)
+        if np.array_equal(labels, previous):
+            return np.where(free, labels, -1)
+
+
+def largest_components(obstacles):
+    """
+    The cells of the largest component of each of a batch of grids, as a flat array of flat cell indices within
+    their grids, with the offset and number of each grid's cells in it
+    """
+    labels = label_components(obstacles).reshape(len(obstacles), -1)
+    sizes = np.bincount(labels[labels >= 0], minlength=obstacles.size)
+    component_sizes = np.where(labels >= 0, sizes[np.maximum(labels, 0)], 0)
+    largest = np.take_along_axis(labels, component_sizes.argmax(axis=1)[:, np.newaxis], axis=1)
+    grid_numbers, cells = np.nonzero((labels == largest) & (labels >= 0))
+    counts = np.bincount(grid_numbers, minlength=len(obstacles))
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return cells, offsets, counts
+
+
+def _later_duplicates(cells):
+    """Where each row of the given array repeats a value from earlier in the row, ignoring -1s"""
+    order = np.argsort(cells, axis=1, kind='stable')
+    ordered = np.take_along_axis(cells, order, axis=1)
+    duplicates = np.zeros(cells.shape, dtype=bool)
+    np.put_along_axis(duplicates, order[:, 1:], (ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] >= 0), axis=1)
+    return duplicates
+
+
+def sample_agents(rng, cells, offsets, counts, num_agents, accept=None, max_rounds=1000):
+    """
+    Draw the goals and starts of num_agents agents for each instance from its grid's cells, given as by
+    largest_components. All the empty agent slots are drawn at once, then slots whose pair isn't accepted or
+    whose start or goal repeats one of an earlier agent of the same instance are emptied and drawn again.
+    accept(instances, goals, starts), if given, says which of the drawn pairs to keep.
+    Returns (instances x agents) arrays of the flat cell indices of the goals and the starts.
+    """
+    if np.any(counts < num_agents):
+        raise ValueError(f'not enough reachable cells for {num_agents} agents')
+    goals = np.full((len(counts), num_agents), -1, dtype=np.int64)
+    starts = np.full((len(counts), num_agents), -1, dtype=np.int64)
+    for _ in range(max_rounds):
+        empty = goals < 0
+        if not empty.any():
+            return goals, starts
+        instances = np.nonzero(empty)[0]
+        draws = (rng.random((len(instances), 2)) * counts[instances, np.newaxis]).astype(np.int64)
+        drawn = cells[draws + offsets[instances, np.newaxis]]
+        kept = accept(instances, drawn[:, 0], drawn[:, 1]) if accept is not None else True
+        goals[empty] = np.where(kept, drawn[:, 0], -1)
+        starts[empty] = np.where(kept, drawn[:, 1], -1)
+        repeated = _later_duplicates(goals) | _later_duplicates(starts)
+        goals[repeated] = -1
+        starts[repeated] = -1
+    raise ValueError(f"couldn't place {num_agents} agents in {max_rounds} rounds - are the distance bins too narrow?")
+
+
+def distance_acceptor(table, minimums, maximums):
+    """An accept function for sample_agents that keeps pairs with a distance in their instance's bin"""
+    numbers = table.cardinality.ravel()
+
+    def accept(instances, goals, starts):
+        distances = table.distances[table.goal_rows[numbers[goals]], numbers[starts]]
+        return (distances >= minimums[instances]) & (distances < maximums[instances])
+    return accept
+
+
+def grid_text(obstacles):
+    """The grid lines ProblemInstance.Export writes"""
+    chars = np.where(obstacles, ord('@'), ord('.')).astype(np.uint8)
+    return np.hstack([chars, np.full((len(chars), 1), ord('\n'), dtype=np.uint8)]).tobytes().decode()
+
+
+def _write_instances(task):
+    output_dir, output_format, names, instance_ids, grid_name, grids, map_filename, goals, starts = task
+    shared_text = grid_text(grids[0]) if len(grids) == 1 and output_format == 'instance' else None
+    for i, name in enumerate(names):
+        obstacles = grids[i if len(grids) > 1 else 0]
+        num_rows, num_columns = obstacles.shape
+        goal_xs, goal_ys = np.divmod(goals[i], num_columns)
+        start_xs, start_ys = np.divmod(starts[i], num_columns)
+        if output_format == 'scen':
+            lines = ['version 1\n'] + [
+                f'1\t{map_filename}\t{num_columns}\t{num_rows}\t{start_y}\t{start_x}\t{goal_y}\t{goal_x}\t-1\n'
+                for goal_x, goal_y, start_x, start_y in zip(goal_xs, goal_ys, start_xs, start_ys)]
+        else:
+            lines = [f'{instance_ids[i]},{grid_name}\n', 'Grid:\n', f'{num_rows},{num_columns}\n',
+                     shared_text or grid_text(obstacles), 'Agents:\n', f'{len(goal_xs)}\n'] + [
+                f'{agent_num},{goal_x},{goal_y},{start_x},{start_y}\n'
+                for agent_num, (goal_x, goal_y, start_x, start_y)
+                in enumerate(zip(goal_xs, goal_ys, start_xs, start_ys))]
+        with open(os.path.join(output_dir, name), 'w') as f:
+            f.writelines(lines)
+    return len(names)
+
+
+def _bin_name(minimum, maximum):
+    return f'{minimum}to{maximum if np.isfinite(maximum) else "inf"}'
+
+
+def map_instances(map_path, num_agents, instance_ids, rng, distance_bins=None, output_format='instance'):
+    """
+    The (names, instance ids, grid name, grids, map file name, goals, starts, bins) of the instances with the given
+    ids on the given map
+    """
+    obstacles = np.asarray(load_grid(map_path), dtype=bool)
+    grid_name = os.path.splitext(os.path.basename(map_path))[0]
+    cells, offsets, counts = largest_components(obstacles[np.newaxis])
+    num_instances = len(instance_ids)
+    accept = None
+    bins = [(0, np.inf)] * num_instances
+    if distance_bins:
+        edges = list(distance_bins) + [np.inf]
+        bins = [(edges[i % (len(edges) - 1)], edges[i % (len(edges) - 1) + 1]) for i in instance_ids]
+        accept = distance_acceptor(compute_table(map_path), np.array([minimum for minimum, _ in bins]),
+                                   np.array([maximum for _, maximum in bins]))
+    goals, starts = sample_agents(rng, cells, np.zeros(num_instances, dtype=np.int64),
+                                  np.repeat(counts, num_instances), num_agents, accept)
+    if output_format == 'scen':
+        names = [f'{grid_name}-{num_agents}agents' + (f'_{_bin_name(*bin)}' if distance_bins else '') + f'-{i}.scen'
+                 for i, bin in zip(instance_ids, bins)]
+    else:
+        names = [f'{grid_name}-{num_agents}-' + (f'{_bin_name(*bin)}-' if distance_bins else '') + f'{i}'
+                 for i, bin in zip(instance_ids, bins)]
+    return names, instance_ids, grid_name, obstacles[np.newaxis], os.path.basename(map_path), goals, starts, bins
+
+
+def random_grid_instances(grid_size, obstacles_percentage, num_agents, instance_ids, rng):
+    """Like map_instances, for instances on random grids with the given percentage of obstacles"""
+    num_obstacles = obstacles_percentage * grid_size * grid_size // 100  # Like Program.cs
+    if num_agents + num_obstacles + 1 > grid_size * grid_size:
+        raise ValueError(f'not enough room for {num_agents} agents and {num_obstacles} obstacles '
+                         f'in a {grid_size}x{grid_size} grid')
+    num_instances = len(instance_ids)
+    grids = np.empty((num_instances, grid_size, grid_size), dtype=bool)
+    todo = np.arange(num_instances)
+    while len(todo):
+        # Regenerate the grids whose largest component is too small for the agents
+        keys = rng.random((len(todo), grid_size * grid_size))
+        ranks = np.argsort(np.argsort(keys, axis=1), axis=1)
+        grids[todo] = (ranks < num_obstacles).reshape(len(todo), grid_size, grid_size)
+        _, _, counts = largest_components(grids[todo])
+        todo = todo[counts < num_agents]
+    cells, offsets, counts = largest_components(grids)
+    goals, starts = sample_agents(rng, cells, offsets, counts, num_agents)
+    names = [f'Instance-{grid_size}-{obstacles_percentage}-{num_agents}-{i}' for i in instance_ids]
+    return (names, instance_ids, 'Random Grid', grids, None, goals, starts,
+            [(0, np.inf)] * num_instances)
+
+
+def write_instances(batch, output_dir, output_format, pool, chunk_size=1000):
+    """Write a batch of instances to files in parallel. Returns the number of files written."""
+    names, instance_ids, grid_name, grids, map_filename, goals, starts, _ = batch
+    tasks = [(output_dir, output_format, names[i:i + chunk_size], instance_ids[i:i + chunk_size], grid_name,
+              grids[i:i + chunk_size] if len(grids) > 1 else grids, map_filename,
+              goals[i:i + chunk_size], starts[i:i + chunk_size])
+             for i in range(0, len(names), chunk_size)]
+    return sum(pool.imap_unordered(_write_instances, tasks))
+
+
+def write_manifest(path, rows):
+    """Append (instance name, grid name, num of agents, instance id, bin) rows to a CSV of the generated instances"""
+    new = not os.path.exists(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(['Instance Name', 'Grid Name', 'Num Of Agents', 'Instance Id', 'Min Distance',
+                             'Max Distance'])
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate problem instances in bulk')
+    parser.add_argument('--map', nargs='*', default=[], help='Map files to generate instances on')
+    parser.add_argument('--grid-size', type=int, nargs='*', default=[], help='Sizes of random grids')
+    parser.add_argument('--obstacles', type=int, nargs='*', default=[15],
+                        help='Percentages of obstacles of random grids')
+    parser.add_argument('--agents', type=int, nargs='+', required=True, help='Numbers of agents')
+    parser.add_argument('--instances', type=int, default=100, help='Instances per map or grid and number of agents')
+    parser.add_argument('--distance-bins', type=int, nargs='*', default=None,
+                        help='Lower edges of start-goal distance bins to stratify map instances by, like 1 10 20 40')
+    parser.add_argument('--format', choices=formats, default='instance')
+    parser.add_argument('-o', '--output-dir', default=instances_dir)
+    parser.add_argument('--batch-size', type=int, default=10000, help='Instances to generate at a time')
+    parser.add_argument('--seed', type=int, default=0, help='For reproducible instances')
+    parser.add_argument('--jobs', type=int, default=None, help='Parallel writers (default: the number of CPUs)')
+    args = parser.parse_args()
+    if args.format == 'scen' and args.grid_size:
+        parser.error('random grids have no map file for the .scen format')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    rng = np.random.default_rng(args.seed)
+    id_batches = [np.arange(start, min(start + args.batch_size, args.instances))
+                  for start in range(0, args.instances, args.batch_size)]
+    batches = ([lambda map_path=map_path, agents=agents, ids=ids:
+                map_instances(map_path, agents, ids, rng, args.distance_bins, args.format)
+                for map_path in args.map for agents in args.agents for ids in id_batches] +
+               [lambda grid_size=grid_size, obstacles=obstacles, agents=agents, ids=ids:
+                random_grid_instances(grid_size, obstacles, agents, ids, rng)
+                for grid_size in args.grid_size for obstacles in args.obstacles for agents in args.agents
+                for ids in id_batches])
+    with multiprocessing.Pool(args.jobs) as pool:
+        for make_batch in batches:
+            batch = make_batch()
+            names, instance_ids, grid_name, _, _, goals, _, bins = batch
+            num_written = write_instances(batch, args.output_dir, args.format, pool)
+            write_manifest(os.path.join(args.output_dir, 'instances.csv'),
+                           [(name, grid_name, goals.shape[1], instance_id, minimum, maximum)
+                            for name, instance_id, (minimum, maximum) in zip(names, instance_ids, bins)])
+            print(f'Wrote {num_written} {grid_name} instances with {goals.shape[1]} agents')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Precompute the BFS distances to goals on a map, and keep them in a memory-mapped table.
+
+Usage: goal_distances.py maps/den520d.map maps/brc202d.map [--goals instance files...] [--sic instance files...]
+
+ProblemInstance.ComputeSingleAgentShortestPaths runs a BFS from every agent's goal on every run. On a given map
+the distances to a goal never change, so they're computed once here, for every free cell of the map as a goal
+or for the goals of a set of instances, and stored as a (goals x free cells) uint16 table. Free cells are
+numbered in row-major order, like ProblemInstance.PrecomputeCardinality numbers them, so a row of the table is
+exactly the singleAgentOptimalCosts of an agent with that goal, with UNREACHABLE instead of -1.
+
+Tables are stored with the map's cached grid (see maps.py), keyed by a hash of the grid, so instance files of
+the same grid share a table. Computing more goals on a map later adds them to its table. Moves are the four
+cardinal ones, like the solvers use.
+"""
+import os
+import os.path
+import json
+import hashlib
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from maps import load_grid, load_instance, cache_dir_path
+
+UNREACHABLE = np.iinfo(np.uint16).max
+FORMAT_VERSION = 1
+_DISTANCES_FILENAME = 'distances.npy'
+_GOALS_FILENAME = 'goals.npy'
+_META_FILENAME = 'meta.json'
+
+
+def cardinality(grid):
+    """The number of each free cell in row-major order, and -1 for obstacles, like ProblemInstance.cardinality"""
+    free = grid == 0
+    numbers = np.cumsum(free.ravel(), dtype=np.int32).reshape(grid.shape) - 1
+    numbers[~free] = -1
+    return numbers
+
+
+def neighbors(grid):
+    """
+    A (free cells x 4) array of the numbers of each free cell's free neighbors, with the number of free cells
+    for a missing neighbor
+    """
+    numbers = cardinality(grid)
+    num_cells = int(numbers.max()) + 1
+    padded = np.pad(numbers, 1, constant_values=-1)
+    rows, columns = np.nonzero(numbers >= 0)
+    result = np.stack([padded[rows, columns + 1], padded[rows + 2, columns + 1],  # Up, down
+                       padded[rows + 1, columns], padded[rows + 1, columns + 2]], axis=1)  # Left, right
+    result[result < 0] = num_cells
+    return result
+
+
+def bfs(neighbor_cells, goals):
+    """
+    The distances from each of the given free cells to every free cell, as a (goals x free cells) uint16 array.
+    The searches from all goals advance a level at a time together, so each level is a few array operations.
+    """
+    num_cells = len(neighbor_cells)
+    stride = num_cells + 1  # A row per goal, with a column for missing neighbors
+    distances = np.full((len(goals), stride), UNREACHABLE, dtype=np.uint16)
+    distances[:, num_cells] = 0  # Missing neighbors are never reached
+    flat = distances.ravel()
+    frontier = np.arange(len(goals)) * stride + np.asarray(goals)
+    flat[frontier] = 0
+    first = np.empty(len(flat), dtype=np.int64)
+    distance = 0
+    while len(frontier):
+        distance += 1
+        if distance >= UNREACHABLE:
+            raise ValueError('distances too long for a uint16 table')
+        rows, cells = np.divmod(frontier, stride)
+        reached = (neighbor_cells[cells] + (rows * stride)[:, np.newaxis]).ravel()
+        reached = reached[flat[reached] == UNREACHABLE]
+        # Keep one of each cell reached more than once, without sorting: the one whose position sticks in first
+        first[reached] = np.arange(len(reached))
+        frontier = reached[first[reached] == np.arange(len(reached))]
+        flat[frontier] = distance
+    return distances[:, :num_cells]
+
+
+_worker_neighbors = None
+
+
+def _init_worker(grid):
+    global _worker_neighbors
+    _worker_neighbors = neighbors(grid)
+
+
+def _compute_rows(args):
+    path, start, goals = args
+    table = np.load(path, mmap_mode='r+')
+    table[start:start + len(goals)] = bfs(_worker_neighbors, goals)
+    table.flush()
+
+
+class DistanceTable:
+    """The distances to a set of goals on a map. Coordinates are (x, y) = (row, column), like ProblemInstance's."""
+    def __init__(self, grid, goals, distances):
+        self.grid = grid
+        self.cardinality = cardinality(grid)
+        self.goals = goals
+        self.distances = distances
+        self.goal_rows = np.full(self.cardinality.max() + 1, -1, dtype=np.int64)
+        self.goal_rows[goals] = np.arange(len(goals))
+
+    def lookup(self, goal_x, goal_y, x, y):
+        """The distances from the given cells to the given goals. Raises KeyError for goals not in the table."""
+        rows = self.goal_rows[self.cardinality[goal_x, goal_y]]
+        if np.any(rows < 0):
+            raise KeyError('goal not in the table')
+        return self.distances[rows, self.cardinality[x, y]]
+
+    def sum_of_individual_costs(self, agents):
+        """
+        The sum of the agents' distances from their starts to their goals - a lower bound on the solution cost.
+        agents is an array of (agent num, goal x, goal y, start x, start y) rows, like maps.Instance.agents.
+        """
+        agents = np.asarray(agents)
+        costs = self.lookup(agents[:, 1], agents[:, 2], agents[:, 3], agents[:, 4])
+        if np.any(costs == UNREACHABLE):
+            raise ValueError('unsolvable instance - an agent cannot reach its goal')
+        return int(costs.sum(dtype=np.int64))
+
+    def export(self, path):
+        """
+        Write the table for the solver, little-endian: int32 rows, columns, number of goals and number of free
+        cells, then the free cell number of each goal as int32, then the uint16 distances row by row.
+        """
+        with open(path, 'wb') as f:
+            np.array([*self.grid.shape, len(self.goals), self.distances.shape[1]], dtype='<i4').tofile(f)
+            np.asarray(self.goals, dtype='<i4').tofile(f)
+            for start in range(0, len(self.goals), 1024):
+                np.asarray(self.distances[start:start + 1024], dtype='<u2').tofile(f)
+
+
+def table_dir_path(path, grid):
+    digest = hashlib.blake2b(np.ascontiguousarray(grid).tobytes(), digest_size=20)
+    digest.update(repr(grid.shape).encode())
+    return os.path.join(cache_dir_path(path), digest.hexdigest() + '.distances')
+
+
+def load_table(path):
+    """The DistanceTable of the given map or instance file, memory-mapped, or None if none was computed"""
+    grid = load_grid(path)
+    table_dir = table_dir_path(path, grid)
+    try:
+        with open(os.path.join(table_dir, _META_FILENAME)) as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            return None
+        goals = np.load(os.path.join(table_dir, _GOALS_FILENAME))
+        distances = np.load(os.path.join(table_dir, _DISTANCES_FILENAME), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    return DistanceTable(grid, goals, distances)
+
+
+def compute_table(path, goals=None, processes=None, chunk_size=64):
+    """
+    Compute the distances to the given goals, as (x, y) pairs, on the given map or instance file, or to all of
+    its free cells if goals is None, and add them to its table. Returns the memory-mapped DistanceTable.
+    """
+    grid = load_grid(path)
+    numbers = cardinality(grid)
+    if goals is None:
+        wanted = np.arange(int(numbers.max()) + 1, dtype=np.int32)
+    else:
+        goals = np.asarray(goals).reshape(-1, 2)
+        wanted = np.unique(numbers[goals[:, 0], goals[:, 1]]).astype(np.int32)
+        if np.any(wanted < 0):
+            raise ValueError('a goal is on an obstacle')
+    existing = load_table(path)
+    if existing is not None and np.isin(wanted, existing.goals).all():
+        return existing
+
+    # Write a new table with the existing rows and the missing ones, and replace the old one when it's complete
+    table_dir = table_dir_path(path, grid)
+    os.makedirs(table_dir, exist_ok=True)
+    old_goals = existing.goals if existing is not None else np.empty(0, dtype=np.int32)
+    missing = np.setdiff1d(wanted, old_goals)
+    all_goals = np.concatenate([old_goals, missing]).astype(np.int32)
+    temp_path = os.path.join(table_dir, _DISTANCES_FILENAME + f'.{os.getpid()}.tmp')
+    table = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.uint16,
+                                      shape=(len(all_goals), int(numbers.max()) + 1))
+    if existing is not None:
+        table[:len(old_goals)] = existing.distances
+    table.flush()
+    del table
+    tasks = [(temp_path, len(old_goals) + start, missing[start:start + chunk_size])
+             for start in range(0, len(missing), chunk_size)]
+    if processes == 1:
+        _init_worker(grid)
+        for task in tasks:
+            _compute_rows(task)
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(np.asarray(grid),)) as pool:
+            for _ in pool.imap_unordered(_compute_rows, tasks):
+                pass
+    meta_path = os.path.join(table_dir, _META_FILENAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # The table is invalid until both its files are replaced
+    np.save(os.path.join(table_dir, _GOALS_FILENAME), all_goals)
+    os.replace(temp_path, os.path.join(table_dir, _DISTANCES_FILENAME))
+    with open(meta_path, 'w') as f:
+        json.dump({'version': FORMAT_VERSION}, f)
+    return load_table(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute goal distance tables of maps')
+    parser.add_argument('maps', nargs='*', help='Map files to compute the distances to all free cells of')
+    parser.add_argument('--goals', nargs='*', default=[],
+                        help="Instance files to compute the distances to their agents' goals, on their own grids")
+    parser.add_argument('--sic', nargs='*', default=[],
+                        help='Instance files to print the sum of individual costs of, using the computed tables')
+    parser.add_argument('--export', action='store_true', help='Also write each table to a "<map>.distances" file '
+                                                                'for the solver')
+    parser.add_argument('--jobs', type=int, default=None, help='Parallel BFS processes (default: the number of CPUs)')
+    args = parser.parse_args()
+
+    tables = {}
+    for path in args.maps:
+        tables[path] = compute_table(path, processes=args.jobs)
+        print(f'{path}: distances to {len(tables[path].goals)} goals')
+    for path in args.goals:
+        agents = load_instance(path).agents
+        tables[path] = compute_table(path, agents[:, 1:3], processes=args.jobs)
+        print(f'{path}: distances to {len(tables[path].goals)} goals')
+    if args.export:
+        for path, table in tables.items():
+            table.export(path + '.distances')
+    for path in args.sic:
+        instance = load_instance(path)
+        table = compute_table(path, instance.agents[:, 1:3], processes=args.jobs)
+        print(f'{path}: sum of individual costs {table.sum_of_individual_costs(instance.agents)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Harvest MDD-SAT output files into a results CSV with the columns Run.cs writes.
+
+Usage: harvest.py "mdd-sat dao" -o mdd-sat-dao.csv
+
+Output files are parsed in a process pool. Files that can't be parsed are listed in a quarantine report
+next to the results CSV instead of stopping the harvest. An index of the parsed rows, keyed by each file's
+path, size and modification time, is kept next to the results CSV too, so harvesting the same
+directories again only parses new or changed files.
+
+MDD-SAT doesn't report the grid's dimensions and number of obstacles, so they're read from the grid's map
+file in the maps directory. Grids without a map file get -1 in those columns.
+"""
+import os
+import re
+import csv
+import glob
+import json
+import argparse
+import multiprocessing
+
+from resource_usage import parse_usage, fieldnames as usage_fieldnames
+from results_cache import irrelevant, read_table
+from maps import load_grid, grid_metadata, map_path
+
+solver_name = 'mdd-sat'
+output_file_suffix = '_output.txt'
+# "<grid name>-<num of agents>-<instance id>_output.txt". Grid names may have dashes too, like maze512-1-6.
+output_filename_pattern = re.compile(r'^(?P<grid_name>.+)-(?P<num_of_agents>\d+)-(?P<instance_id>\d+)_output\.txt$')
+# The statistics columns the C# solvers write that MDD-SAT doesn't report
+unreported_statistics = ['Generated (HL)', 'Look Ahead Nodes Created (HL)', 'Adoptions (HL)',
+                         'Nodes Expanded With Goal Cost (HL)', 'Conflicts Bypassed With Adoption (HL)', 'Expanded (HL)']
+usage_statistics = ['wall_time', 'user_time', 'system_time', 'peak_rss_kb', 'memory_limit_exceeded']
+# The line run-mdd-sat.py writes the solution cost in, after the usage - 0 if there's no solution
+cost_fieldname = 'Solution Cost'
+FORMAT_VERSION = 2  # Of the parsed rows in the index - bump to parse every file again
+
+instance_fieldnames = ['Grid Name', 'Grid Rows', 'Grid Columns', 'Instance Name', 'Num Of Agents', 'Num Of Obstacles',
+                       'Instance Id']
+fieldnames = instance_fieldnames + [f'{solver_name} {name}' for name in
+                                    ['Success', 'Runtime', 'Solution Cost'] + unreported_statistics +
+                                    [usage_fieldnames[field] for field in usage_statistics] + ['Solution Depth']]
+
+
+def solver_cost(lines):
+    """The cost on the second line of the output file MDD-SAT writes, which is 0 if there's no solution"""
+    if len(lines) < 2 or ':' not in lines[1]:
+        raise ValueError('no solution cost line')
+    return int(lines[1].split(':')[1])
+
+
+def solution_cost(output):
+    """
+    The solution cost of an output file, 0 if it has no solution. Raises ValueError if it has no cost.
+    Files measured by run-mdd-sat.py have it in a line of its own, since a run killed by a limit leaves an empty
+    or partial output from the solver. Older files are just the solver's output.
+    """
+    lines = output.splitlines()
+    if 'Censored: True' in lines:  # Skipped by run-mdd-sat.py because easier instances failed
+        return 0
+    for line in reversed(lines):
+        fieldname, _, value = line.partition(': ')
+        if fieldname == cost_fieldname:
+            return int(value)
+    if parse_usage(output) is not None:
+        raise ValueError('no solution cost line')
+    return solver_cost(lines)
+
+
+def parse_output(path):
+    """The results row of an MDD-SAT output file. Raises ValueError if the file isn't a complete output."""
+    match = output_filename_pattern.match(os.path.basename(path))
+    if match is None:
+        raise ValueError('unexpected file name')
+    with open(path) as f:
+        output = f.read()
+    lines = output.splitlines()
+    if not lines or not lines[-1].startswith('Total time (seconds):'):
+        raise ValueError('no total time - the run was cut short')
+    seconds = float(lines[-1].split(':')[1])
+    cost = solution_cost(output)
+    success = cost != 0
+    usage = parse_usage(output)
+
+    row = {
+        'Grid Name': match['grid_name'],
+        'Grid Rows': -1,
+        'Grid Columns': -1,
+        'Instance Name': os.path.basename(path)[:-len(output_file_suffix)],
+        'Num Of Agents': int(match['num_of_agents']),
+        'Num Of Obstacles': -1,
+        'Instance Id': int(match['instance_id']),
+        f'{solver_name} Success': 1 if success else 0,
+        f'{solver_name} Runtime': seconds * 1000,
+        f'{solver_name} Solution Cost': cost if success else -2,
+        f'{solver_name} Solution Depth': -1,
+    }
+    for name in unreported_statistics:
+        row[f'{solver_name} {name}'] = -1
+    for field in usage_statistics:
+        value = getattr(usage, field) if usage is not None else irrelevant
+        row[f'{solver_name} {usage_fieldnames[field]}'] = int(value) if isinstance(value, bool) else value
+    return row
+
+
+def _harvest_file(path):
+    try:
+        return path, parse_output(path), None
+    except (OSError, ValueError, IndexError) as e:
+        return path, None, str(e)
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def output_paths(inputs):
+    """The output files in the given files and directories"""
+    for path in inputs:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(glob.escape(path), '*' + output_file_suffix)))
+        else:
+            yield path
+
+
+def _grid_columns(grid_names, maps_dir):
+    """The grid columns of each of the given grid names, from its map file if there is one"""
+    columns = {}
+    for grid_name in grid_names:
+        path = map_path(grid_name, maps_dir)
+        columns[grid_name] = grid_metadata(load_grid(path)) if os.path.exists(path) else {}
+    return columns
+
+
+def harvest(inputs, results_path, processes=None, maps_dir='maps'):
+    """
+    Harvest the output files in the given files and directories into the given results CSV.
+    Returns the number of files parsed, and the quarantined (path, error) pairs.
+    """
+    index_path = results_path + '.index.json'
+    quarantine_path = os.path.splitext(results_path)[0] + ' quarantine.csv'
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    paths = list(dict.fromkeys(output_paths(inputs)))
+    keys = {path: _file_key(path) for path in paths}
+    changed = [path for path in paths if path not in index or index[path]['key'] != keys[path] or
+               index[path].get('version') != FORMAT_VERSION]
+    if changed:
+        with multiprocessing.Pool(processes) as pool:
+            for path, row, error in pool.imap_unordered(_harvest_file, changed, chunksize=64):
+                index[path] = {'key': keys[path], 'version': FORMAT_VERSION, 'row': row, 'error': error}
+                if row is not None and not row[f'{solver_name} Success'] and row[f'{solver_name} Runtime'] < 50000:
+                    print(f'failed fast for {path}')
+    index = {path: index[path] for path in paths}  # Forget files that are gone
+
+    parsed_rows = [index[path]['row'] for path in paths if index[path]['row'] is not None]
+    grid_columns = _grid_columns({row['Grid Name'] for row in parsed_rows}, maps_dir)
+    rows = [[grid_columns[row['Grid Name']].get(fieldname, row[fieldname]) for fieldname in fieldnames]
+            for row in parsed_rows]
+    _write_atomically(results_path, [row + [''] for row in [fieldnames] + rows])  # Like Run.cs, end lines with a delimiter
+    quarantined = [(path, index[path]['error']) for path in paths if index[path]['error'] is not None]
+    _write_atomically(quarantine_path, [['Path', 'Problem']] + quarantined)
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(temp_path, index_path)
+    return len(changed), quarantined
+
+
+def _write_atomically(path, rows):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', newline='') as f:
+        csv.writer(f, lineterminator='\n').writerows(rows)
+    os.replace(temp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Harvest MDD-SAT output files into a results CSV')
+    parser.add_argument('inputs', nargs='+', help='Output files, or directories of them')
+    parser.add_argument('-o', '--output', default='mdd-sat-dao.csv', help='The results CSV to write')
+    parser.add_argument('--jobs', type=int, default=None, help='Parallel parsers (default: the number of CPUs)')
+    parser.add_argument('--maps-dir', default='maps', help='Where the .map files of the grids are')
+    parser.add_argument('--columnar', action='store_true',
+                        help='Also store the results in the typed, memory-mapped format of results_cache.py')
+    args = parser.parse_args(argv)
+
+    num_parsed, quarantined = harvest(args.inputs, args.output, args.jobs, args.maps_dir)
+    print(f'Parsed {num_parsed} new or changed files into {args.output}')
+    if quarantined:
+        print(f'{len(quarantined)} files could not be parsed - see {os.path.splitext(args.output)[0]} quarantine.csv')
+    if args.columnar:
+        read_table(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Features of problem instances, for predicting which solver will be fastest on them.
+
+Usage: instance_features.py Results.csv --instances-dir ../../../Instances -o features.csv
+
+An instance's features describe its grid - its size, obstacles and corridors - and its agents - how crowded
+they are, how long their shortest paths are, and how much those paths overlap. An agent's shortest-path
+region is the set of cells on any of its shortest paths, the cells whose distance from its start plus their
+distance to its goal equals its shortest path's length. Two agents whose regions intersect may have to
+coordinate, and a corridor cell in several agents' regions is a likely bottleneck.
+"""
+import os
+import os.path
+import argparse
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from maps import load_instance, load_scen
+from goal_distances import cardinality, neighbors, bfs, UNREACHABLE
+from results import read_results
+
+feature_names = ['Grid Rows', 'Grid Columns', 'Free Cells', 'Obstacle Ratio', 'Corridor Ratio', 'Dead Ends',
+                 'Num Of Agents', 'Agent Density', 'Sum Of Individual Costs', 'Max Individual Cost',
+                 'Mean Individual Cost', 'Overlapping Pairs Ratio', 'Shared Cells Ratio', 'Contested Corridor Cells']
+
+
+def instance_features(instance):
+    """The features of the given maps.Instance, as an array in the order of feature_names"""
+    grid = np.asarray(instance.grid)
+    agents = instance.agents
+    numbers = cardinality(grid)
+    neighbor_cells = neighbors(grid)
+    num_cells = len(neighbor_cells)
+    degrees = (neighbor_cells < num_cells).sum(axis=1)
+    up, down, left, right = (neighbor_cells < num_cells).T
+    corridors = (degrees == 2) & ((up & down) | (left & right))
+
+    goals = numbers[agents[:, 1], agents[:, 2]]
+    starts = numbers[agents[:, 3], agents[:, 4]]
+    to_goal = bfs(neighbor_cells, goals).astype(np.int32)
+    from_start = bfs(neighbor_cells, starts).astype(np.int32)
+    costs = to_goal[np.arange(len(agents)), starts]
+    if np.any(costs == UNREACHABLE):
+        raise ValueError('unsolvable instance - an agent cannot reach its goal')
+    regions = (to_goal + from_start) == costs[:, np.newaxis]
+    as_float = regions.astype(np.float32)
+    intersections = as_float @ as_float.T
+    num_pairs = len(agents) * (len(agents) - 1) // 2
+    overlapping_pairs = (np.count_nonzero(intersections) - len(agents)) // 2
+    agents_per_cell = regions.sum(axis=0)
+    union = np.count_nonzero(agents_per_cell)
+
+    return np.array([
+        grid.shape[0], grid.shape[1], num_cells, 1 - num_cells / grid.size, corridors.sum() / num_cells,
+        np.count_nonzero(degrees <= 1),
+        len(agents), len(agents) / num_cells, costs.sum(), costs.max(), costs.mean(),
+        overlapping_pairs / num_pairs if num_pairs else 0, np.count_nonzero(agents_per_cell >= 2) / union,
+        np.count_nonzero((agents_per_cell >= 2) & corridors),
+    ], dtype=np.float64)
+
+
+def load_instance_file(path, num_agents=None, maps_dir=None):
+    """The maps.Instance of a combined instance file or a .scen file, with only its first num_agents agents"""
+    if path.endswith('.scen'):
+        return load_scen(path, num_agents, maps_dir)
+    instance = load_instance(path)
+    return instance._replace(agents=instance.agents[:num_agents])
+
+
+def _features_of(args):
+    path, num_agents, maps_dir = args
+    try:
+        return instance_features(load_instance_file(path, num_agents, maps_dir)), None
+    except (OSError, ValueError, IndexError, StopIteration) as e:
+        return None, f'{path}: {e}'
+
+
+def results_features(data, instances_dir, maps_dir=None, processes=None):
+    """
+    The features of the instances of the given parsed results (see results.read_results), as a DataFrame with
+    the same index. Instances whose files can't be read are reported and left out.
+    """
+    keys = data.index.to_frame(index=False)
+    tasks = [(os.path.join(instances_dir, name), int(num_agents), maps_dir)
+             for name, num_agents in zip(keys['Instance Name'], keys['Num Of Agents'])]
+    unique_tasks = list(dict.fromkeys(tasks))
+    with multiprocessing.Pool(processes) as pool:
+        results = dict(zip(unique_tasks, pool.map(_features_of, unique_tasks, chunksize=16)))
+    for _, error in results.values():
+        if error is not None:
+            print(f"Can't compute features - {error}")
+    rows = [results[task][0] for task in tasks]
+    found = np.array([row is not None for row in rows], dtype=bool)
+    return pd.DataFrame([row for row in rows if row is not None], index=data.index[found], columns=feature_names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute the features of the instances of results CSVs')
+    parser.add_argument('results', nargs='+')
+    parser.add_argument('--instances-dir', default=os.path.join('..', '..', '..', 'Instances'),
+                        help='Where the instance files named in the Instance Name column are')
+    parser.add_argument('--maps-dir', default=None, help='Where the maps of .scen files are (default: like Import)')
+    parser.add_argument('-o', '--output', default='features.csv')
+    parser.add_argument('--jobs', type=int, default=None, help='Parallel processes (default: the number of CPUs)')
+    args = parser.parse_args()
+
+    frames = [results_features(read_results(path), args.instances_dir, args.maps_dir, args.jobs)
+              for path in args.results]
+    features = pd.concat(frames)
+    features = features[~features.index.duplicated(keep='last')]
+    # Num Of Agents is both an instance column and a feature
+    features.reset_index([name for name in features.index.names if name not in feature_names]).to_csv(args.output,
+                                                                                                   index=False)
+    print(f'Wrote the features of {len(features)} instances to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
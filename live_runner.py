@@ -0,0 +1,200 @@
+"""
+Run many solver processes at once and follow their output as it's printed.
+
+Usage: live_runner.py commands.txt --concurrency 200 --events events.jsonl
+
+commands.txt has one solver command per line, for example the per-job commands of run_benchmark.py.
+Each process' stdout is parsed line by line as it arrives into events - an instance started, a solver
+started, solved it or failed, its runtime and statistics, the process exited or stalled. Every event is
+appended to a JSON lines file, and folded into an in-memory aggregate that's printed periodically, so
+success rates and nodes per second are visible while the jobs are still running.
+
+A process that prints nothing for --stall-timeout seconds is killed and reported as stalled, and one
+that exits with an error is reported as soon as it does. A command that can't be started, and a process
+that prints a line longer than MAX_LINE_LENGTH, are reported as failed without stopping the other jobs.
+"""
+import re
+import sys
+import json
+import time
+import shlex
+import asyncio
+import argparse
+from collections import defaultdict, Counter
+
+# What Run.cs and the solvers' OutputStatistics print, and the events they become
+line_patterns = [
+    (re.compile(r'^Solving (?P<instance>.+?)( agent (?P<agent>\d+))?$'), 'instance'),
+    (re.compile(r'^-{5,}(?P<solver>.+?)-{5,}$'), 'solver'),
+    (re.compile(r'^Total cost: (?P<cost>-?\d+)$'), 'solved'),
+    (re.compile(r'^Failed to solve$'), 'unsolved'),
+    (re.compile(r'^Time In milliseconds: (?P<runtime>[\d.Ee+-]+)$'), 'runtime'),
+    (re.compile(r'^\+SUCCESS\+ \(:$'), 'success'),
+    (re.compile(r'^-FAILURE- \):$'), 'failure'),
+    (re.compile(r'^-NO SOLUTION- \]:$'), 'no solution'),
+    (re.compile(r'^(?P<name>Total (Expanded|Generated) Nodes[^:]*): (?P<value>\d+)$'), 'statistic'),
+]
+outcomes = ['success', 'failure', 'no solution']
+MAX_LINE_LENGTH = 1 << 20  # Printed plans of many agents make long lines
+
+
+def parse_line(line):
+    """The event a line of solver output describes, as a (kind, fields) pair, or None"""
+    line = line.strip()
+    for pattern, kind in line_patterns:
+        match = pattern.match(line)
+        if match:
+            return kind, {name: value for name, value in match.groupdict().items() if value is not None}
+    return None
+
+
+class Aggregate:
+    """Running totals of the events of all jobs, per solver"""
+    def __init__(self):
+        self.start = time.time()
+        self.jobs = Counter()  # started, exited, failed, stalled
+        self.outcomes = defaultdict(Counter)
+        self.runtime = Counter()  # ms, of successful runs
+        self.expanded = Counter()  # of runs with a known runtime
+        self.expanded_runtime = Counter()  # ms, of runs with known expanded nodes
+        self.current = {}  # The solver run each job is in the middle of
+
+    def add(self, job, kind, fields):
+        if kind in ('started', 'exited', 'failed', 'stalled'):
+            self.jobs[kind] += 1
+            self.current.pop(job, None)
+        elif kind == 'solver':
+            self.current[job] = {'solver': fields['solver']}
+        elif job in self.current:
+            run = self.current[job]
+            if kind == 'runtime':
+                run['runtime'] = float(fields['runtime'])
+            elif kind == 'statistic' and fields['name'].startswith('Total Expanded Nodes'):
+                run.setdefault('expanded', int(fields['value']))  # The high-level count comes first
+            elif kind in outcomes:
+                solver = run['solver']
+                self.outcomes[solver][kind] += 1
+                if kind == 'success' and 'runtime' in run:
+                    self.runtime[solver] += run['runtime']
+                if 'runtime' in run and 'expanded' in run:
+                    self.expanded[solver] += run['expanded']
+                    self.expanded_runtime[solver] += run['runtime']
+                del self.current[job]
+
+    def summary(self):
+        lines = [f'{time.time() - self.start:.0f}s: {self.jobs["started"]} jobs started, {self.jobs["exited"]} exited, '
+                 f'{self.jobs["failed"]} failed, {self.jobs["stalled"]} stalled']
+        for solver, counts in self.outcomes.items():
+            runs = sum(counts.values())
+            successes = counts['success']
+            mean_runtime = f'{self.runtime[solver] / successes:,.0f}ms' if successes else '-'
+            nodes_per_second = (f'{self.expanded[solver] / self.expanded_runtime[solver] * 1000:,.0f}'
+                                if self.expanded_runtime[solver] else '-')
+            lines.append(f'  {solver}: solved {successes}/{runs}, mean runtime of solved {mean_runtime}, '
+                         f'{nodes_per_second} expanded nodes/s')
+        return '\n'.join(lines)
+
+
+class EventLog:
+    """Appends events to a JSON lines file, one line per event"""
+    def __init__(self, path):
+        self.file = open(path, 'a', buffering=1)
+
+    def write(self, job, kind, fields):
+        self.file.write(json.dumps({'time': time.time(), 'job': job, 'event': kind, **fields}) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+async def run_job(job, command, aggregate, event_log, stall_timeout=None):
+    def emit(kind, **fields):
+        aggregate.add(job, kind, fields)
+        event_log.write(job, kind, fields)
+
+    try:
+        process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.DEVNULL,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT,
+                                                       limit=MAX_LINE_LENGTH)
+    except OSError as error:  # Like a command that doesn't exist
+        emit('failed', command=command, error=repr(error))
+        print(f"{job} couldn't start: {error}", file=sys.stderr)
+        return
+    emit('started', command=command)
+    while True:
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), stall_timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            emit('stalled', seconds=stall_timeout)
+            print(f'{job} printed nothing for {stall_timeout}s - killed it', file=sys.stderr)
+            return
+        except (ValueError, asyncio.LimitOverrunError) as error:  # A line longer than MAX_LINE_LENGTH
+            process.kill()
+            await process.wait()
+            emit('failed', error=repr(error))
+            print(f'{job} printed a line longer than {MAX_LINE_LENGTH} bytes - killed it', file=sys.stderr)
+            return
+        if not line:
+            break
+        event = parse_line(line.decode(errors='replace'))
+        if event is not None:
+            kind, fields = event
+            emit(kind, **fields)
+    status = await process.wait()
+    if status != 0:
+        emit('failed', status=status)
+        print(f'{job} exited with status {status}', file=sys.stderr)
+    else:
+        emit('exited', status=status)
+
+
+async def run_all(commands, concurrency, events_path, stall_timeout=None, progress_interval=10):
+    aggregate = Aggregate()
+    event_log = EventLog(events_path)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(job, command):
+        async with semaphore:
+            await run_job(job, command, aggregate, event_log, stall_timeout)
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            print(aggregate.summary(), flush=True)
+
+    reporter = asyncio.create_task(report_progress())
+    try:
+        # Let every job finish even if one raises, so none of them writes to the closed event log
+        results = await asyncio.gather(*(limited(job, command) for job, command in enumerate(commands)),
+                                       return_exceptions=True)
+    finally:
+        reporter.cancel()
+        event_log.close()
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return aggregate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run solver processes concurrently, following their output live')
+    parser.add_argument('commands', nargs='?', type=argparse.FileType('r'), default=sys.stdin,
+                        help='A file with a command per line (default: stdin)')
+    parser.add_argument('--concurrency', type=int, default=100, help='Processes to run at once')
+    parser.add_argument('--events', default='events.jsonl', help='The JSON lines file to append events to')
+    parser.add_argument('--stall-timeout', type=float, default=None,
+                        help='Kill a process that prints nothing for this many seconds')
+    parser.add_argument('--progress-interval', type=float, default=10, help='Seconds between progress reports')
+    args = parser.parse_args()
+
+    commands = [shlex.split(line) for line in args.commands if line.strip() and not line.startswith('#')]
+    aggregate = asyncio.run(run_all(commands, args.concurrency, args.events, args.stall_timeout,
+                                    args.progress_interval))
+    print(aggregate.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Load grid maps into compact NumPy arrays, with a memory-mapped cache of parsed grids.
+
+Reads the map formats ProblemInstance.cs reads:
+octile .map files of the movingai benchmark ("type octile", "height H", "width W", "map", then the rows),
+Liron's maps (a "rows,columns" line, then rows with 1 for an obstacle),
+and the combined instance files ProblemInstance.Export writes ("id,grid name", "Grid:", "rows,columns",
+the rows, "Agents:", the number of agents, then an "agent num,goal x,goal y,start x,start y" line per agent).
+The agents of movingai .scen files are read too, with the grid of their map.
+
+A grid is a rows x columns uint8 array with 1 for an obstacle and 0 for a free cell, indexed [x, y] like
+ProblemInstance.grid. The first time a file is loaded its grid is saved as an .npy file named by the file's
+content hash in a cache directory next to it, and later loads memory-map it instead of parsing the text.
+"""
+import os
+import os.path
+import hashlib
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+OBSTACLE = 1
+FREE = 0
+obstacle_chars = b'@OTW'  # Like ProblemInstance.readBenchmarkMap - water isn't traversable from land
+liron_obstacle_chars = b'1'
+
+CACHE_DIRNAME = '.grid-cache'
+FORMAT_VERSION = 1
+
+# agents is a (number of agents) x 5 int array of agent num, goal x, goal y, start x, start y
+Instance = namedtuple('Instance', ['instance_id', 'grid_name', 'grid', 'agents'])
+
+
+def cache_dir_path(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+
+
+def _parse_rows(lines, num_rows, num_columns, obstacles):
+    if len(lines) < num_rows or any(len(line) < num_columns for line in lines[:num_rows]):
+        raise ValueError(f'expected {num_rows} rows of {num_columns} cells')
+    cells = np.frombuffer(b''.join(line[:num_columns] for line in lines[:num_rows]), dtype=np.uint8)
+    grid = np.isin(cells, np.frombuffer(obstacles, dtype=np.uint8)).astype(np.uint8)
+    return grid.reshape(num_rows, num_columns)
+
+
+def _dimensions(line):
+    num_rows, num_columns = line.split(b',')[:2]
+    return int(num_rows), int(num_columns)
+
+
+def _instance_start(lines):
+    """The index of the "Grid:" line of a combined instance file, or None if it isn't one"""
+    for i in range(min(2, len(lines))):
+        if lines[i].startswith(b'Grid:'):
+            return i
+    return None
+
+
+def parse_grid(data):
+    """The grid of the given contents of a map or instance file"""
+    lines = data.splitlines()
+    if not lines:
+        raise ValueError('empty map')
+    if lines[0].strip() == b'type octile':
+        header = dict(line.split(None, 1) for line in lines[1:3])
+        if not lines[3].startswith(b'map'):
+            raise ValueError('no "map" line after the octile header')
+        return _parse_rows(lines[4:], int(header[b'height']), int(header[b'width']), obstacle_chars)
+    grid_line = _instance_start(lines)
+    if grid_line is not None:
+        num_rows, num_columns = _dimensions(lines[grid_line + 1])
+        return _parse_rows(lines[grid_line + 2:], num_rows, num_columns, obstacle_chars)
+    num_rows, num_columns = _dimensions(lines[0])
+    return _parse_rows(lines[1:], num_rows, num_columns, liron_obstacle_chars)
+
+
+def _cached_grid(data, cache_dir):
+    digest = hashlib.blake2b(data, digest_size=20)
+    digest.update(f'version {FORMAT_VERSION}'.encode())
+    cache_path = os.path.join(cache_dir, digest.hexdigest() + '.npy')
+    try:
+        return np.load(cache_path, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    grid = parse_grid(data)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.npy.tmp', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, grid)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        return grid  # A read-only directory - just don't cache
+    return np.load(cache_path, mmap_mode='r')
+
+
+def load_grid(path, cache_dir=None):
+    """The grid of the given map or instance file, memory-mapped from the cache"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return _cached_grid(data, cache_dir or cache_dir_path(path))
+
+
+def load_instance(path, cache_dir=None):
+    """The Instance in the given combined instance file, like ProblemInstance.Import reads it"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    lines = data.splitlines()
+    grid_line = _instance_start(lines)
+    if grid_line is None:
+        raise ValueError(f'{path} has no "Grid:" line')
+    instance_id, grid_name = 0, 'Random Grid'  # The defaults of ProblemInstance.Import
+    if grid_line == 1:
+        first_line = lines[0].decode().split(',')
+        instance_id = int(first_line[0])
+        if len(first_line) > 1:
+            grid_name = first_line[1]
+    num_rows, _ = _dimensions(lines[grid_line + 1])
+    agents_line = grid_line + 2 + num_rows
+    if agents_line >= len(lines) or not lines[agents_line].startswith(b'Agents:'):
+        raise ValueError(f'{path} has no "Agents:" line after the grid')
+    num_agents = int(lines[agents_line + 1])
+    # Agent lines may have a comment after the five numbers
+    agents = np.array([line.split(b',')[:5] for line in lines[agents_line + 2:agents_line + 2 + num_agents]],
+                      dtype=np.int64).reshape(-1, 5)
+    if len(agents) != num_agents:
+        raise ValueError(f'{path} has {len(agents)} agents instead of {num_agents}')
+    return Instance(instance_id, grid_name, _cached_grid(data, cache_dir or cache_dir_path(path)), agents)
+
+
+def load_scen(path, num_agents=None, maps_dir=None, cache_dir=None):
+    """
+    The Instance of the first num_agents agents of the given movingai .scen file, or of all of them. Like
+    ProblemInstance.Import, the map is looked for in ../../maps relative to the .scen file's directory,
+    unless a maps directory is given.
+    """
+    with open(path) as f:
+        next(f)  # Format version
+        rows = [line.rstrip('\n').split('\t') for line in f if line.strip()]
+    if num_agents is not None:
+        rows = rows[:num_agents]
+    if not rows:
+        raise ValueError(f'{path} has no agents')
+    map_filename = rows[0][1]
+    if maps_dir is None:
+        maps_dir = os.path.join(os.path.dirname(path), '..', '..', 'maps')
+    stem = os.path.splitext(os.path.basename(path))[0]
+    instance_id = int(stem.rsplit('-', 1)[-1]) if stem.rsplit('-', 1)[-1].isdigit() else 0
+    # Columns: block, map, width, height, start column, start row, goal column, goal row, optimal length
+    coordinates = np.array([row[4:8] for row in rows], dtype=np.int64)
+    agents = np.column_stack([np.arange(len(rows)), coordinates[:, 3], coordinates[:, 2], coordinates[:, 1],
+                              coordinates[:, 0]])
+    grid = load_grid(os.path.join(maps_dir, map_filename), cache_dir)
+    return Instance(instance_id, map_filename, grid, agents)
+
+
+def grid_metadata(grid):
+    """The grid columns of a results CSV, as Run.cs writes them"""
+    num_rows, num_columns = grid.shape
+    return {'Grid Rows': num_rows, 'Grid Columns': num_columns, 'Num Of Obstacles': int(np.count_nonzero(grid))}
+
+
+def map_path(grid_name, maps_dir='maps'):
+    """The .map file of the given grid name, which may or may not have the .map suffix"""
+    return os.path.join(maps_dir, grid_name if grid_name.endswith('.map') else grid_name + '.map')
@@ -0,0 +1,205 @@
+"""
+Merge results CSVs from several machines or reruns into one, without duplicate instances.
+
+Usage: merge_results.py shard1.csv shard2.csv ... -o merged.csv [--policy latest|success|best]
+
+Instances are identified by their Grid Name, Instance Name, Num Of Agents and Instance Id. The merged
+header is the union of the inputs' headers: the instance columns, then each solver's block of columns in
+the order the solvers first appear. Columns a file doesn't have are filled with "irrelevant", as Run.cs
+does for solvers it didn't run. A column is identified by its solver's block and its name, and repeated names
+by the order they're in - CBS writes its low level solver's columns in its block, so several blocks have
+columns with the same name, and a block may have a name more than once.
+
+When an instance appears more than once, each solver's block is taken from one of the rows where that
+solver ran, by the policy:
+latest - the last one, with later input files being later,
+success - the last successful one, or the last one if none succeeded,
+best - the fastest successful one, or the last one if none succeeded.
+The instance columns are taken from the last row.
+
+The merge streams: rows are spread by a hash of their instance to bucket files small enough to
+de-duplicate in memory, and the de-duplicated buckets are merged back in the order instances first appeared.
+"""
+import os
+import csv
+import heapq
+import shutil
+import hashlib
+import argparse
+import tempfile
+from contextlib import ExitStack
+
+from results import instance_fieldnames
+from results_cache import read_header, irrelevant
+
+policies = ['latest', 'success', 'best']
+MAX_BUCKETS = 256  # Bucket files are all open at once
+
+
+def column_keys(header):
+    """
+    The key of each column of a results header: its block, its name and how many columns of its block before it
+    have the same name. The block of the instance columns is None, and a solver's block is the solver's name and
+    how many blocks of the same solver came before it. The empty name after the trailing delimiter gets None.
+    """
+    keys = []
+    block = None
+    block_counts = {}
+    name_counts = {}
+    for fieldname in header:
+        if fieldname == '':
+            keys.append(None)
+            continue
+        if fieldname.endswith(' Success'):
+            solver = fieldname[:-len(' Success')]
+            block = (solver, block_counts.get(solver, 0))
+            block_counts[solver] = block[1] + 1
+            name_counts = {}
+        keys.append((block, fieldname, name_counts.get(fieldname, 0)))
+        name_counts[fieldname] = name_counts.get(fieldname, 0) + 1
+    return keys
+
+
+def merged_layout(headers):
+    """
+    The column keys of the instance columns and of each solver block of the union of the given headers,
+    in order of first appearance
+    """
+    instance_keys = []
+    block_keys = {}
+    for header in headers:
+        for key in column_keys(header):
+            if key is None:
+                continue
+            keys = instance_keys if key[0] is None else block_keys.setdefault(key[0], [])
+            if key not in keys:
+                keys.append(key)
+    return instance_keys, block_keys
+
+
+def _bucket_of(key, num_buckets):
+    return int.from_bytes(hashlib.blake2b('\0'.join(key).encode(), digest_size=8).digest(), 'big') % num_buckets
+
+
+def _choose(rows, policy, success_position, runtime_position, cost_position):
+    """The row to take a solver's block from, among an instance's rows ordered from first to last"""
+    ran = [row for row in rows if row[cost_position] != irrelevant]
+    if not ran:
+        # Prefer a row from a file that has the solver's columns, where they hold what Run.cs writes for
+        # solvers it didn't run, over one where they're just filled in
+        present = [row for row in rows if row[success_position] != irrelevant]
+        return present[-1] if present else rows[-1]
+    if policy == 'latest':
+        return ran[-1]
+    successful = [row for row in ran if row[success_position] == '1']
+    if not successful:
+        return ran[-1]
+    if policy == 'success':
+        return successful[-1]
+
+    def runtime(row):
+        if runtime_position is None:
+            return 0
+        try:
+            return float(row[runtime_position])
+        except ValueError:
+            return float('inf')
+    return min(reversed(successful), key=runtime)  # The last of the fastest
+
+
+def merge(input_paths, output_path, policy='latest', memory_limit=512 * 1024 * 1024):
+    """
+    Merge the given results CSVs into the given output path.
+    Returns the number of rows read and the number of rows written.
+    """
+    headers = [read_header(path) for path in input_paths]
+    instance_keys, block_keys = merged_layout(headers)
+    keys = instance_keys + [key for keys in block_keys.values() for key in keys]
+    fieldnames = [fieldname for _, fieldname, _ in keys]
+    positions = {key: position for position, key in enumerate(keys)}
+    key_positions = [positions[None, fieldname, 0] for fieldname in instance_fieldnames
+                     if (None, fieldname, 0) in positions]
+    solver_positions = []
+    for block, keys in block_keys.items():
+        solver = block[0]
+        success_position = positions[block, f'{solver} Success', 0]
+        solver_positions.append((success_position, positions.get((block, f'{solver} Runtime', 0)),
+                                 positions.get((block, f'{solver} Solution Cost', 0), success_position),
+                                 [positions[key] for key in keys]))
+
+    num_buckets = min(sum(os.path.getsize(path) for path in input_paths) // max(memory_limit, 1) + 1,
+                      MAX_BUCKETS)
+    temp_dir = tempfile.mkdtemp(prefix='merge_results.', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        # Spread the rows, in the merged layout and prefixed with their ordinal, to buckets by their instance
+        bucket_files = [open(os.path.join(temp_dir, f'{i}.csv'), 'w', newline='') for i in range(num_buckets)]
+        bucket_writers = [csv.writer(f) for f in bucket_files]
+        num_rows_read = 0
+        for path, header in zip(input_paths, headers):
+            mapping = [(position, positions[key]) for position, key in enumerate(column_keys(header))
+                       if key is not None]
+            with open(path, newline='') as f:
+                reader = csv.reader(f)
+                next(reader)
+                for row in reader:
+                    if not row:
+                        continue
+                    merged = [irrelevant] * len(fieldnames)
+                    for position, merged_position in mapping:
+                        if position < len(row):
+                            merged[merged_position] = row[position]
+                    key = [merged[position] for position in key_positions]
+                    bucket_writers[_bucket_of(key, num_buckets)].writerow([num_rows_read] + merged)
+                    num_rows_read += 1
+        for f in bucket_files:
+            f.close()
+
+        # De-duplicate each bucket in memory, keeping each instance at the ordinal of its first row
+        for i in range(num_buckets):
+            instances = {}
+            with open(os.path.join(temp_dir, f'{i}.csv'), newline='') as f:
+                for row in csv.reader(f):
+                    instances.setdefault(tuple(row[1 + position] for position in key_positions), []).append(row)
+            with open(os.path.join(temp_dir, f'{i}.merged.csv'), 'w', newline='') as f:
+                writer = csv.writer(f)
+                for rows in sorted(instances.values(), key=lambda rows: int(rows[0][0])):
+                    merged = rows[-1][1:]
+                    for success_position, runtime_position, cost_position, block_positions in solver_positions:
+                        chosen = _choose([row[1:] for row in rows], policy, success_position, runtime_position,
+                                         cost_position)
+                        for position in block_positions:
+                            merged[position] = chosen[position]
+                    writer.writerow([rows[0][0]] + merged)
+            os.remove(os.path.join(temp_dir, f'{i}.csv'))
+
+        # Merge the buckets back in order of first appearance
+        num_rows_written = 0
+        temp_path = output_path + '.tmp'
+        with ExitStack() as stack, open(temp_path, 'w', newline='') as f:
+            readers = [csv.reader(stack.enter_context(open(os.path.join(temp_dir, f'{i}.merged.csv'), newline='')))
+                       for i in range(num_buckets)]
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(fieldnames + [''])  # Like Run.cs, end each line with a delimiter
+            for row in heapq.merge(*readers, key=lambda row: int(row[0])):
+                writer.writerow(row[1:] + [''])
+                num_rows_written += 1
+        os.replace(temp_path, output_path)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return num_rows_read, num_rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge results CSVs, removing duplicate instances')
+    parser.add_argument('input_paths', nargs='+')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--policy', choices=policies, default='latest',
+                        help='Which run of a solver on a duplicate instance to keep')
+    parser.add_argument('--memory', type=int, default=512, help='MB of rows to de-duplicate in memory at a time')
+    args = parser.parse_args()
+    num_rows_read, num_rows_written = merge(args.input_paths, args.output, args.policy, args.memory * 1024 * 1024)
+    print(f'Merged {num_rows_read} rows into {num_rows_written} in {args.output}')
+
+
+if __name__ == '__main__':
+    main()
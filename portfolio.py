@@ -0,0 +1,160 @@
+"""
+Simulate running portfolios of solvers, from the runtimes in results CSVs.
+
+Usage: portfolio.py Results.csv ... [--solvers 2] [--budget 120000] [--top 10]
+
+Unlike runtimes_and_successes.py, no instance is dropped because a solver failed on it - a failure counts as a
+penalized runtime. PAR-k scores average the runtimes of solved instances and k times the time limit for the rest.
+The virtual best solver (VBS) takes the best solver for each instance, the single best solver (SBS) is the one with
+the best PAR-10 score.
+
+A schedule gives each of its solvers a time slice. Its solvers start together in parallel and each is stopped at
+the end of its slice, so an instance's runtime under the schedule is the runtime of the fastest solver that solved
+it within its slice, and its CPU cost is at most the sum of the slices. Static schedules are searched exhaustively
+over all sets of k solvers and a grid of slices, and a portfolio is also built greedily under a CPU budget, by
+repeatedly giving the most PAR-10 reduction per CPU millisecond.
+"""
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from results import load_results, MAX_TIME
+
+
+def runtime_matrix(data):
+    """The solvers and an (instances x solvers) array of runtimes, with inf for failures and solvers not run"""
+    solved = (data['Success'] & data['Ran']).to_numpy()
+    runtimes = np.where(solved, data['Runtime'].to_numpy(dtype=np.float64), np.inf)
+    return list(data['Success'].columns), runtimes
+
+
+def par_scores(runtimes, time_limit, factor, axis=0):
+    """The PAR-factor score along the given axis - unsolved instances count as factor * time_limit"""
+    return np.where(runtimes <= time_limit, runtimes, factor * time_limit).mean(axis=axis)
+
+
+def solver_summary(solvers, runtimes, time_limit=MAX_TIME):
+    """Solved count, PAR-2 and PAR-10 of each solver, the virtual best solver and the single best solver"""
+    best = runtimes.min(axis=1)
+    table = pd.DataFrame({
+        'Solved': np.append((runtimes <= time_limit).sum(axis=0), (best <= time_limit).sum()),
+        'PAR-2': np.append(par_scores(runtimes, time_limit, 2), par_scores(best, time_limit, 2)),
+        'PAR-10': np.append(par_scores(runtimes, time_limit, 10), par_scores(best, time_limit, 10)),
+    }, index=solvers + ['VBS'])
+    single_best = table['PAR-10'].iloc[:-1].idxmin()
+    table.loc[f'SBS ({single_best})'] = table.loc[single_best]
+    return table
+
+
+def slice_levels(runtimes, num_levels=16, time_limit=MAX_TIME):
+    """Candidate slice lengths: quantiles of the solved runtimes, up to the time limit"""
+    solved = runtimes[runtimes <= time_limit]
+    if not len(solved):
+        return np.array([time_limit], dtype=np.float64)
+    levels = np.quantile(solved, np.linspace(0, 1, num_levels)[1:])
+    return np.unique(np.append(np.minimum(levels, time_limit), time_limit))
+
+
+def search_schedules(runtimes, levels, num_solvers, budget=np.inf, time_limit=MAX_TIME, chunk_size=4096):
+    """
+    Evaluate every schedule of num_solvers solvers with slices from the given levels and a total slice of at most
+    the budget. Returns the (solver indices, slice level indices) of the schedules and their PAR-10 totals.
+
+    Instances are grouped by the slice levels their runtimes fall in - instances in the same group are solved by
+    the same solvers under every schedule - and each group keeps, for each subset of the solvers, the sum of the
+    subset's best runtimes. A schedule's total is then a lookup per group.
+    """
+    num_levels = len(levels)
+    # The index of the shortest slice that solves each run, or num_levels if none does
+    run_levels = np.searchsorted(levels, runtimes, side='left')
+    level_grid = np.array(list(itertools.product(range(num_levels), repeat=num_solvers)), dtype=np.int64)
+    level_grid = level_grid[levels[level_grid].sum(axis=1) <= budget]
+    subsets = np.arange(1 << num_solvers)
+    penalty = 10 * time_limit
+    schedules, totals = [], []
+    for solver_set in itertools.combinations(range(runtimes.shape[1]), num_solvers):
+        groups, group_of = np.unique(run_levels[:, solver_set], axis=0, return_inverse=True)
+        group_of = group_of.ravel()
+        set_runtimes = np.where(np.isfinite(runtimes[:, solver_set]), runtimes[:, solver_set], 0)
+        # group_sums[g, m] is the sum over group g of the best runtime among the solvers in subset m
+        group_sums = np.empty((len(groups), len(subsets)))
+        group_sums[:, 0] = penalty * np.bincount(group_of, minlength=len(groups))
+        for subset in subsets[1:]:
+            members = [j for j in range(num_solvers) if subset >> j & 1]
+            group_sums[:, subset] = np.bincount(group_of, set_runtimes[:, members].min(axis=1), minlength=len(groups))
+        for start in range(0, len(level_grid), chunk_size):
+            chunk = level_grid[start:start + chunk_size]
+            solving = groups[np.newaxis, :, :] <= chunk[:, np.newaxis, :]  # (schedules x groups x solvers)
+            codes = (solving << np.arange(num_solvers)).sum(axis=2)
+            totals.append(np.take_along_axis(group_sums[np.newaxis, :, :], codes[:, :, np.newaxis], axis=2)[:, :, 0]
+                          .sum(axis=1))
+            schedules.extend((solver_set, tuple(levels_row)) for levels_row in chunk.tolist())
+    return schedules, np.concatenate(totals) if totals else np.empty(0)
+
+
+def greedy_portfolio(runtimes, levels, budget, time_limit=MAX_TIME, chunk_size=16384):
+    """
+    Build a schedule by repeatedly lengthening one solver's slice to one of the levels, choosing the change with
+    the largest PAR-10 reduction per CPU millisecond that fits in the budget. Returns the slice of each solver,
+    0 for solvers not in the portfolio, and the (solver, slice, PAR-10) steps.
+    """
+    penalty = 10 * time_limit
+    slices = np.zeros(runtimes.shape[1])
+    current = np.full(len(runtimes), penalty)  # Each instance's penalized runtime under the schedule so far
+    steps = []
+    while True:
+        # The PAR-10 total with each possible change, summed over chunks of instances
+        totals = np.zeros((runtimes.shape[1], len(levels)))
+        for start in range(0, len(runtimes), chunk_size):
+            chunk = runtimes[start:start + chunk_size, :, np.newaxis]
+            within = np.where(chunk <= levels, chunk, penalty)
+            totals += np.minimum(current[start:start + chunk_size, np.newaxis, np.newaxis], within).sum(axis=0)
+        extra_cpu = levels[np.newaxis, :] - slices[:, np.newaxis]
+        allowed = (extra_cpu > 0) & (slices.sum() + extra_cpu <= budget)
+        gains = np.where(allowed, (current.sum() - totals) / np.where(extra_cpu > 0, extra_cpu, 1), -np.inf)
+        solver, level = np.unravel_index(np.argmax(gains), gains.shape)
+        if gains[solver, level] <= 0:
+            return slices, steps
+        slices[solver] = levels[level]
+        current = np.minimum(current, np.where(runtimes[:, solver] <= levels[level], runtimes[:, solver], penalty))
+        steps.append((solver, levels[level], current.mean()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate solver portfolios on results CSVs')
+    parser.add_argument('results', nargs='+')
+    parser.add_argument('--time-limit', type=float, default=MAX_TIME, help='ms')
+    parser.add_argument('--solvers', type=int, default=2, help='Solvers to run in parallel in searched schedules')
+    parser.add_argument('--levels', type=int, default=16, help='Slice lengths to consider per solver')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='CPU ms per instance a schedule may use (default: the time limit per solver)')
+    parser.add_argument('--top', type=int, default=10, help='Best searched schedules to print')
+    args = parser.parse_args()
+
+    data = load_results(args.results)
+    data = data[~data.index.duplicated(keep='last')]
+    solvers, runtimes = runtime_matrix(data)
+    print(f'{len(runtimes)} instances')
+    print(solver_summary(solvers, runtimes, args.time_limit).to_string(float_format='{:,.1f}'.format))
+
+    levels = slice_levels(runtimes, args.levels, args.time_limit)
+    budget = args.budget if args.budget is not None else args.solvers * args.time_limit
+    num_solvers = min(args.solvers, len(solvers))
+    schedules, totals = search_schedules(runtimes, levels, num_solvers, budget, args.time_limit)
+    print(f'\nSearched {len(schedules)} schedules of {num_solvers} solvers. The best, by PAR-10:')
+    cpu = np.array([levels[list(level_indices)].sum() for _, level_indices in schedules])
+    for i in np.lexsort((cpu, totals))[:args.top]:  # The cheapest of equally good schedules first
+        solver_set, level_indices = schedules[i]
+        slices = ', '.join(f'{solvers[j]} {levels[level]:,.0f}ms' for j, level in zip(solver_set, level_indices))
+        print(f'  {totals[i] / len(runtimes):,.1f}: {slices}')
+
+    slices, steps = greedy_portfolio(runtimes, levels, budget, args.time_limit)
+    print(f'\nGreedy portfolio with a budget of {budget:,.0f} CPU ms:')
+    for solver, slice_length, par10 in steps:
+        print(f'  {solvers[solver]} up to {slice_length:,.0f}ms - PAR-10 {par10:,.1f}')
+
+
+if __name__ == '__main__':
+    main()
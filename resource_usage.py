@@ -0,0 +1,105 @@
+"""
+Run external solvers without a shell and measure exactly what they used.
+
+The child's resource usage comes from os.wait4, so it covers the solver process alone - not a shell
+or the Python process running it. CPU time and memory can be capped with rlimits set in the child
+before it starts the solver.
+
+The usage is written as "Field: value" lines that parse_usage reads back.
+
+A process that runs out of address space under a memory limit fails its allocation, so it dies of an abort, a
+segmentation fault or an error exit, depending on the solver - it can't be told apart from a crash by its status.
+So any failure of a run with a memory limit, other than running out of CPU time, counts as exceeding the memory
+limit.
+"""
+import os
+import sys
+import time
+import signal
+import resource
+import subprocess
+from collections import namedtuple
+from functools import partial
+
+Usage = namedtuple('Usage', ['exit_status', 'signal', 'wall_time', 'user_time', 'system_time', 'peak_rss_kb',
+                             'cpu_limit_exceeded', 'memory_limit_exceeded'])
+
+# How each field is written, in the units of its name
+fieldnames = {
+    'exit_status': 'Exit Status',
+    'signal': 'Signal',
+    'wall_time': 'Wall Time (seconds)',
+    'user_time': 'User CPU Time (seconds)',
+    'system_time': 'System CPU Time (seconds)',
+    'peak_rss_kb': 'Peak RSS (KB)',
+    'cpu_limit_exceeded': 'CPU Limit Exceeded',
+    'memory_limit_exceeded': 'Memory Limit Exceeded',
+}
+# Fields that usage written before they were added doesn't have, and their values for it
+_later_fields = {'memory_limit_exceeded': 'False'}
+
+
+def _set_limits(cpu_limit, memory_limit):
+    """Runs in the child between fork and exec"""
+    if cpu_limit is not None:
+        # SIGXCPU at the soft limit, SIGKILL a second later if it's ignored
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def run_measured(command, cpu_limit=None, memory_limit=None, **popen_kwargs):
+    """
+    Run the given command (a list of arguments) and wait for it.
+    cpu_limit is in seconds of user+system CPU time, memory_limit is in bytes of address space.
+    Other keyword arguments are passed to subprocess.Popen.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, preexec_fn=partial(_set_limits, cpu_limit, memory_limit), **popen_kwargs)
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - start
+    # Like os.waitstatus_to_exitcode, which needs Python 3.9. Setting it means Popen doesn't wait for it again.
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+    signal_name = signal.Signals(os.WTERMSIG(status)).name if os.WIFSIGNALED(status) else None
+    cpu_time = rusage.ru_utime + rusage.ru_stime
+    peak_rss_kb = rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else rusage.ru_maxrss  # Bytes on macOS
+    cpu_limit_exceeded = cpu_limit is not None and (signal_name == 'SIGXCPU' or
+                                                    (signal_name == 'SIGKILL' and cpu_time >= cpu_limit))
+    return Usage(exit_status=process.returncode, signal=signal_name, wall_time=wall_time,
+                 user_time=rusage.ru_utime, system_time=rusage.ru_stime, peak_rss_kb=peak_rss_kb,
+                 cpu_limit_exceeded=cpu_limit_exceeded,
+                 memory_limit_exceeded=memory_limit is not None and process.returncode != 0 and not cpu_limit_exceeded)
+
+
+def format_usage(usage):
+    return ''.join(f'{fieldnames[field]}: {value}\n' for field, value in usage._asdict().items())
+
+
+def read_usage(path, tail_size=4096):
+    """The Usage written at the end of a file, like a solver's log, or None if there's none"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(0, os.path.getsize(path) - tail_size))
+            return parse_usage(f.read().decode(errors='replace'))
+    except OSError:
+        return None
+
+
+def parse_usage(text):
+    """The Usage in the given text, or None if it has no usage lines"""
+    by_fieldname = {}
+    for line in text.splitlines():
+        fieldname, _, value = line.partition(': ')
+        by_fieldname[fieldname] = value.strip()
+    for field, value in _later_fields.items():
+        by_fieldname.setdefault(fieldnames[field], value)
+    if not all(fieldname in by_fieldname for fieldname in fieldnames.values()):
+        return None
+    values = {field: by_fieldname[fieldname] for field, fieldname in fieldnames.items()}
+    return Usage(exit_status=int(values['exit_status']),
+                 signal=None if values['signal'] == 'None' else values['signal'],
+                 wall_time=float(values['wall_time']), user_time=float(values['user_time']),
+                 system_time=float(values['system_time']), peak_rss_kb=int(values['peak_rss_kb']),
+                 cpu_limit_exceeded=values['cpu_limit_exceeded'] == 'True',
+                 memory_limit_exceeded=values['memory_limit_exceeded'] == 'True')
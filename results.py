@@ -0,0 +1,292 @@
+"""
+Vectorized loading and aggregation of the results CSVs that Run.cs writes.
+
+Each row of a results file describes one problem instance, followed by a block of
+columns per solver. The functions here parse such a file once and reshape it so that its
+columns are indexed by (metric, solver), which lets every metric of every solver be
+aggregated per category in a single groupby.
+"""
+import os
+import multiprocessing
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from results_cache import read_table, read_header, irrelevant
+
+category_name = 'Num Of Agents'
+instance_fieldnames = ['Grid Name', 'Instance Name', 'Num Of Agents', 'Instance Id']
+MAX_TIME = 60000  # ms, Constants.MAX_TIME - the time limit of the runs
+MIN_RUNTIME = 1.0  # ms. Runtimes are clamped to it so instant solves don't give infinite speedups or log ratios.
+
+Aggregates = namedtuple('Aggregates', ['solvers', 'metrics', 'run_counts', 'success_rates', 'num_averaged', 'means', 'stds'])
+
+
+def solver_names(fieldnames):
+    """Solver names in the order their columns appear, found by their Success column."""
+    return [fieldname[:-len(' Success')] for fieldname in fieldnames if fieldname.endswith(' Success')]
+
+
+def metric_registry(fieldnames):
+    """
+    Map the position of every solver column in a results header to its (metric, solver) pair.
+
+    Run.cs writes each solver's columns as a block that starts with its Success column and continues with
+    whatever its OutputStatisticsHeader writes, so every column is attributed to the last solver whose
+    Success column preceded it. The solver's name is stripped from the start of the column name to get the
+    metric name. Columns written by a solver's low-level solvers, heuristics and open lists under their own
+    name keep their full name as the metric name.
+    The Success columns themselves aren't metrics and aren't included.
+    """
+    registry = {}
+    seen = set()
+    solver = None
+    for position, fieldname in enumerate(fieldnames):
+        if fieldname.endswith(' Success'):
+            solver = fieldname[:-len(' Success')]
+            continue
+        if solver is None or fieldname == '':  # Instance columns, or the empty name after the trailing delimiter
+            continue
+        metric = fieldname[len(solver) + 1:] if fieldname.startswith(solver + ' ') else fieldname
+        if (metric, solver) not in seen:
+            seen.add((metric, solver))
+            registry[position] = (metric, solver)
+    return registry
+
+
+def _numeric(values):
+    """Convert a column of a results table to numbers, with values that aren't numbers as NaN"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _compact_numeric(values):
+    """Like _numeric, but as int32 (nullable) if all values are small enough integers, and as float32 otherwise"""
+    values = _numeric(values)
+    present = values.dropna()
+    if ((present % 1) == 0).all() and present.between(np.iinfo(np.int32).min, np.iinfo(np.int32).max).all():
+        return values.astype('Int32')
+    return values.astype(np.float32)
+
+
+def _parse_table(header, raw, compact=False, report_bad_rows=True):
+    """
+    Build the (field, solver) frame of read_results from a table whose columns are labeled by
+    their position in the header. With compact=True, metrics are stored as int32 or float32 and
+    the instance names as categoricals.
+    """
+    solvers = solver_names(header)
+    positions = {fieldname: position for position, fieldname in reversed(list(enumerate(header)))}
+
+    num_of_agents = _numeric(raw[positions[category_name]])
+    successes = raw[[positions[f'{solver} Success'] for solver in solvers]].apply(_numeric)
+    bad_rows = num_of_agents.isna() | successes.isna().any(axis=1)
+    if report_bad_rows:
+        for _, row in raw[bad_rows].iterrows():
+            print(f"Problem in row: num agents={row[positions[category_name]]} instance id={row[positions['Instance Id']]}")
+    raw = raw[~bad_rows]
+    successes = successes[~bad_rows]
+
+    fields = {}
+    for solver in solvers:
+        cost_position = positions.get(f'{solver} Solution Cost')
+        fields['Ran', solver] = raw[cost_position].notna() if cost_position is not None else pd.Series(False, index=raw.index)
+        fields['Success', solver] = successes[positions[f'{solver} Success']] == 1
+    for position, (metric, solver) in metric_registry(header).items():
+        if position in raw:
+            fields[metric, solver] = _compact_numeric(raw[position]) if compact else _numeric(raw[position]).astype(np.float64)
+
+    data = pd.DataFrame(fields)
+    data.columns.names = ['field', 'solver']
+    index = raw[[positions[fieldname] for fieldname in instance_fieldnames]].copy()
+    index.columns = instance_fieldnames
+    index[category_name] = num_of_agents[~bad_rows].astype(np.int32 if compact else int)
+    if compact:
+        index = index.astype({'Grid Name': 'category', 'Instance Name': 'category'})
+    data.index = pd.MultiIndex.from_frame(index)
+    return data
+
+
+def read_results(path, report_bad_rows=True):
+    """
+    Parse a results CSV into a DataFrame whose columns are indexed by (field, solver) and
+    whose rows are indexed by the instance_fieldnames.
+
+    Fields:
+    'Ran' - the solver was actually run on the instance (its Solution Cost isn't "irrelevant"),
+    'Success' - the solver solved the instance,
+    and one float field per metric in the file's metric_registry, with "irrelevant" values as NaN.
+    Rows with an unparsable agent count or success column are reported and dropped.
+    """
+    # Columns are read by position - a low-level solver shared by several solvers writes the same column names
+    # more than once
+    header, raw = read_table(path)
+    return _parse_table(header, raw, report_bad_rows=report_bad_rows)
+
+
+def read_results_chunks(path, chunksize, report_bad_rows=True):
+    """
+    Like read_results, but stream the file in chunks of at most chunksize rows with compact dtypes,
+    without going through the cache. Only the columns the aggregation needs are parsed.
+    """
+    header = read_header(path)
+    needed_fieldnames = set(instance_fieldnames) | {f'{solver} {suffix}' for solver in solver_names(header)
+                                                    for suffix in ('Success', 'Solution Cost')}
+    usecols = sorted({position for position, fieldname in enumerate(header) if fieldname in needed_fieldnames} |
+                     set(metric_registry(header)))
+    for chunk in pd.read_csv(path, header=None, skiprows=1, usecols=usecols, na_values=[irrelevant],
+                             chunksize=chunksize, low_memory=False):
+        yield _parse_table(header, chunk, compact=True, report_bad_rows=report_bad_rows)
+
+
+def concat_results(frames):
+    """Concatenate parsed results, treating solvers missing from a file as not run there."""
+    data = pd.concat(frames, sort=False)
+    for field in ('Ran', 'Success'):
+        data[field] = data[field].fillna(False).astype(bool)
+    return data
+
+
+def load_results(paths):
+    frames = []
+    for i, path in enumerate(paths):
+        print(f"Reading input file {i}")
+        frames.append(read_results(path))
+    return concat_results(frames)
+
+
+def metric_names(data):
+    """The metrics present in parsed results, in the order they were first seen."""
+    return [field for field in data.columns.unique(level='field') if field not in ('Ran', 'Success')]
+
+
+def _per_solver(frame, fields):
+    """Broadcast a (rows x solvers) frame over the given (field, solver) columns."""
+    return frame.reindex(columns=fields.get_level_values('solver'), fill_value=False).to_numpy()
+
+
+def _accumulate(total, part):
+    """Add up partial per-category sums that may have different categories and columns"""
+    return part if total is None else total.add(part, fill_value=0)
+
+
+def count_runs(data):
+    """Per-category counts of the instances each solver was run on and solved"""
+    categories = data.index.get_level_values(category_name)
+    return data['Ran'].groupby(categories).sum(), data['Success'].groupby(categories).sum()
+
+
+def success_rates_of(run_counts, success_counts):
+    return (success_counts / run_counts).where(run_counts > 0)
+
+
+def sum_metrics(data, success_rates, min_success_to_consider=0.0):
+    """
+    Per-category number of averaged instances, and sums, counts and sums of squares of every metric
+    over them.
+
+    A solver is relevant in a category if it solved more than min_success_to_consider of the
+    problems it was run on there. An instance's metrics are averaged only if every relevant solver
+    that was run on it succeeded, so that solvers aren't compared over different problem sets.
+    """
+    categories = data.index.get_level_values(category_name)
+    ran = data['Ran'].fillna(False).astype(bool)
+    succeeded = data['Success'].fillna(False).astype(bool)
+
+    category_success_rates = success_rates.reindex(index=categories, columns=ran.columns).to_numpy(dtype=float)
+    relevant = ran & (np.nan_to_num(category_success_rates, nan=0.0) > min_success_to_consider)
+    all_relevant_succeeded = (succeeded | ~relevant).all(axis=1)
+    num_averaged = all_relevant_succeeded.groupby(categories).sum()
+
+    values = data[metric_names(data)].astype(np.float64)
+    averaged = relevant & all_relevant_succeeded.to_numpy()[:, np.newaxis]
+    averaged_values = values.where(_per_solver(averaged, values.columns))
+    grouped = averaged_values.groupby(categories)
+    return num_averaged, grouped.sum(), grouped.count(), (averaged_values ** 2).groupby(categories).sum()
+
+
+def _aggregates(run_counts, success_rates, num_averaged, sums, counts, squares):
+    solvers = [solver for solver in run_counts.columns if run_counts[solver].any()]
+    metrics = list(sums.columns.unique(level='field'))
+    counts = counts.where(counts > 0)
+    means = sums / counts
+    variances = (squares - sums * means) / (counts - 1)
+    return Aggregates(solvers, metrics, run_counts, success_rates, num_averaged, means, np.sqrt(variances.clip(lower=0)))
+
+
+def aggregate(data, min_success_to_consider=0.0):
+    """Compute per-category run counts, success rates and averages of every metric in one pass."""
+    run_counts, success_counts = count_runs(data)
+    success_rates = success_rates_of(run_counts, success_counts)
+    return _aggregates(run_counts, success_rates, *sum_metrics(data, success_rates, min_success_to_consider))
+
+
+def aggregate_chunked(paths, min_success_to_consider=0.0, chunksize=100000):
+    """
+    Like aggregate(load_results(paths)), but for inputs larger than memory: the files are streamed twice in chunks,
+    once to count successes and once to sum the metrics, keeping only per-category accumulators between chunks.
+    Peak memory depends on the chunk size and the number of categories, not on the number of rows.
+    """
+    run_counts = success_counts = None
+    for i, path in enumerate(paths):
+        print(f"Reading input file {i}")
+        for data in read_results_chunks(path, chunksize):
+            chunk_run_counts, chunk_success_counts = count_runs(data)
+            run_counts = _accumulate(run_counts, chunk_run_counts)
+            success_counts = _accumulate(success_counts, chunk_success_counts)
+    success_rates = success_rates_of(run_counts, success_counts)
+
+    num_averaged = sums = counts = squares = None
+    for path in paths:
+        for data in read_results_chunks(path, chunksize, report_bad_rows=False):
+            chunk_num_averaged, chunk_sums, chunk_counts, chunk_squares = sum_metrics(data, success_rates, min_success_to_consider)
+            num_averaged = _accumulate(num_averaged, chunk_num_averaged)
+            sums = _accumulate(sums, chunk_sums)
+            counts = _accumulate(counts, chunk_counts)
+            squares = _accumulate(squares, chunk_squares)
+    return _aggregates(run_counts, success_rates, num_averaged, sums, counts, squares)
+
+
+def _count_file_runs(i_and_path):
+    i, path = i_and_path
+    print(f"Reading input file {i}")
+    return count_runs(read_results(path))
+
+
+def _sum_file_metrics(path_and_args):
+    path, success_rates, min_success_to_consider = path_and_args
+    return sum_metrics(read_results(path, report_bad_rows=False), success_rates, min_success_to_consider)
+
+
+def _map(function, items, processes):
+    if processes == 1:
+        return list(map(function, items))
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(function, items)
+
+
+def aggregate_files(paths, min_success_to_consider=0.0, processes=None):
+    """
+    Like aggregate(load_results(paths)), but each file is parsed and pre-aggregated into per-category
+    partial sums in a separate process. The partial sums are then added up in the order of the paths,
+    so the results are exactly the same for any number of processes.
+    By default, uses a process per file, up to the number of CPUs.
+    """
+    if processes is None:
+        processes = max(1, min(len(paths), os.cpu_count()))
+    run_counts = success_counts = None
+    for file_run_counts, file_success_counts in _map(_count_file_runs, list(enumerate(paths)), processes):
+        run_counts = _accumulate(run_counts, file_run_counts)
+        success_counts = _accumulate(success_counts, file_success_counts)
+    success_rates = success_rates_of(run_counts, success_counts)
+
+    num_averaged = sums = counts = squares = None
+    for file_num_averaged, file_sums, file_counts, file_squares in _map(
+            _sum_file_metrics, [(path, success_rates, min_success_to_consider) for path in paths], processes):
+        num_averaged = _accumulate(num_averaged, file_num_averaged)
+        sums = _accumulate(sums, file_sums)
+        counts = _accumulate(counts, file_counts)
+        squares = _accumulate(squares, file_squares)
+    return _aggregates(run_counts, success_rates, num_averaged, sums, counts, squares)
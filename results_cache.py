@@ -0,0 +1,171 @@
+"""
+A typed, memory-mapped cache of parsed results CSVs.
+
+The first time a CSV is read, each of its columns is converted to a NumPy array and saved as an .npy file
+in a "<csv path>.cache" directory next to it. Later reads just memory-map those arrays instead of parsing
+the text again.
+
+Columns are stored as one of:
+'int' - int64, for columns that are all integers (including the -1/-2 placeholders),
+'float' - float64, with the "irrelevant" sentinel as NaN,
+'category' - int32 codes into a list of strings, with code -1 for "irrelevant".
+
+The cache is keyed by the CSV's path, size, modification time and content hash. The hash is only
+recomputed when the size or modification time changed, so a touched or copied file whose content is
+unchanged keeps its cache, and a warm cache is validated with a single stat().
+"""
+import os
+import os.path
+import csv
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+irrelevant = 'irrelevant'  # What Run.cs writes for the statistics of solvers that weren't run
+
+CACHE_SUFFIX = '.cache'
+FORMAT_VERSION = 1
+_META_FILENAME = 'meta.json'
+
+
+def read_header(path):
+    with open(path, newline='') as f:
+        return next(csv.reader(f))
+
+
+def cache_dir_path(path):
+    return path + CACHE_SUFFIX
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, _META_FILENAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(cache_dir, meta):
+    temp_path = os.path.join(cache_dir, _META_FILENAME + '.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(temp_path, os.path.join(cache_dir, _META_FILENAME))
+
+
+def _valid_meta(path, cache_dir):
+    """The cache's metadata if it describes the current content of the given CSV, None otherwise"""
+    meta = _read_meta(cache_dir)
+    if meta is None or meta.get('version') != FORMAT_VERSION:
+        return None
+    key = _stat_key(path)
+    if all(meta['key'][name] == value for name, value in key.items()):
+        return meta
+    if meta['key']['size'] != key['size'] or meta['hash'] != content_hash(path):
+        return None
+    # Same content under a new path or modification time - just refresh the key
+    meta['key'] = key
+    _write_meta(cache_dir, meta)
+    return meta
+
+
+def _column_arrays(values):
+    """Convert a column parsed by pandas to its stored kind and arrays"""
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return {'kind': 'int'}, {'values': values.to_numpy(np.int64)}
+    if pd.api.types.is_float_dtype(values.dtype):
+        return {'kind': 'float'}, {'values': values.to_numpy(np.float64)}
+    codes, categories = pd.factorize(values)
+    return {'kind': 'category', 'categories': [str(category) for category in categories]}, \
+           {'codes': codes.astype(np.int32)}
+
+
+def _build_cache(path, cache_dir):
+    header = read_header(path)
+    # Empty cells are kept as strings so only "irrelevant" becomes NaN
+    raw = pd.read_csv(path, header=None, skiprows=1, keep_default_na=False, na_values=[irrelevant],
+                      float_precision='round_trip', low_memory=False)
+    columns = []
+    parent_dir = os.path.dirname(os.path.abspath(cache_dir))
+    temp_dir = tempfile.mkdtemp(prefix=os.path.basename(cache_dir) + '.', dir=parent_dir)
+    try:
+        for position in raw.columns:
+            column, arrays = _column_arrays(raw[position])
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_dir, f'{position}.{name}.npy'), array)
+            columns.append(column)
+        meta = {'version': FORMAT_VERSION, 'key': _stat_key(path), 'hash': content_hash(path),
+                'header': header, 'num_rows': len(raw), 'columns': columns}
+        _write_meta(temp_dir, meta)
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        try:
+            os.replace(temp_dir, cache_dir)
+        except OSError:  # Another process built the cache at the same time
+            shutil.rmtree(temp_dir)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return meta
+
+
+def read_table(path):
+    """
+    Read a results CSV through its cache, building the cache first if it's missing or stale.
+
+    Returns the header (with any duplicate names) and a DataFrame whose columns are labeled by their
+    position in the header. Numeric columns are backed by read-only memory-mapped arrays.
+    """
+    cache_dir = cache_dir_path(path)
+    meta = _valid_meta(path, cache_dir)
+    if meta is None:
+        meta = _build_cache(path, cache_dir)
+    columns = {}
+    for position, column in enumerate(meta['columns']):
+        if column['kind'] == 'category':
+            codes = np.load(os.path.join(cache_dir, f'{position}.codes.npy'), mmap_mode='r')
+            columns[position] = pd.Categorical.from_codes(codes, column['categories'], validate=False)
+        else:
+            columns[position] = np.load(os.path.join(cache_dir, f'{position}.values.npy'), mmap_mode='r')
+    return meta['header'], pd.DataFrame(columns, copy=False)
+
+
+def format_column(values):
+    """Format a column as read_table returns it back into the text Run.cs would have written"""
+    if pd.api.types.is_float_dtype(values.dtype):
+        array = values.to_numpy()
+        present = ~np.isnan(array)
+        text = np.full(len(array), irrelevant, dtype=object)
+        if np.all(np.mod(array[present], 1) == 0):  # Integers with "irrelevant" values
+            text[present] = array[present].astype(np.int64).astype(str)
+        else:
+            text[present] = [repr(value)[:-len('.0')] if repr(value).endswith('.0') else repr(value)
+                             for value in array[present].tolist()]  # Like C#, which doesn't write a .0 suffix
+        return text
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy().astype(str)
+    return values.astype(object).where(values.notna(), irrelevant).to_numpy()
+
+
+def write_csv(path, header, table):
+    """Write rows of a table as read_table returns it to a CSV with the given header"""
+    text = pd.DataFrame({position: format_column(table[position]) for position in table.columns})
+    with open(path, 'w', newline='') as f:
+        f.write(','.join(header) + '\n')
+        text.to_csv(f, header=False, index=False)
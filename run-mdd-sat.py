@@ -1,57 +1,104 @@
-import subprocess
-import multiprocessing
-import os
-import argparse
-import time
-import glob
-import signal
-import sys
-
-def main():
-    pass
-    
-if __name__ == '__main__':
-    def myworker(filepath):
-        #if 'maze' not in filepath:
-        #    return
-        if 'output' in filepath:
-            return
-        output_path = '{}_output.txt'.format(filepath)
-        if os.path.exists(output_path):
-            return
-        if not os.path.exists(filepath):
-            return
-        command = './solver_reLOC --output-file={1} --bgu-input={0} --cost-limit=65536 --layer-limit=65536 --makespan-limit=65536 --minisat-timeout=300 --total-timeout=300 --encoding=mdd > /dev/null'.format(filepath, output_path)
-        print(f'running {command}')
-        try:
-            start = time.time()
-            subprocess.check_call(command, shell=True)
-            end = time.time()
-            with open(output_path, 'a') as f:
-                f.write('\nTotal time (seconds): {}'.format(end - start))
-        except:
-            #pool.terminate()
-            raise
-            
-    def gen():
-        for agents in xrange(5, 85, 5):
-            for i in xrange(100):
-                #maze_index = int(sys.argv[0])
-                #yield '/home/ubuntu/maze512-1-{}-{}-{}'.format(maze_index, agents, i)
-                #yield '/home/ubuntu/maze512-2-{}-{}-{}'.format(maze_index, agents, i)
-                if i % 3 == int(sys.argv[0):
-                    yield '/home/ubuntu/ost003d-{}-{}'.format(agents, i)
-                    yield '/home/ubuntu/den520d-{}-{}'.format(agents, i)
-                    yield '/home/ubuntu/brc202d-{}-{}'.format(agents, i)
-    
-    original_sigint_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
-    pool = multiprocessing.Pool()
-    signal.signal(signal.SIGINT, original_sigint_handler)
-    try:
-        res = pool.map_async(myworker, gen())
-        res.get(9999999999999999999999999)
-    except KeyboardInterrupt:
-        pool.terminate()
-    else:
-        pool.close()
-    pool.join()
+"""
+Run MDD-SAT (solver_reLOC) on the DAO map instances, resumably and sharded across machines.
+
+Usage, on each of N machines: run-mdd-sat.py --shard I --num-shards N
+Run it again after a crash or an interrupt to resume. --status shows the progress.
+
+With --min-success-rate, each map's agent counts run in increasing order, and once the success rate
+at an agent count drops below it, larger agent counts are skipped. Their output files say they were
+censored, so they count as failures.
+"""
+import os
+import time
+import argparse
+import subprocess
+
+from scheduler import JobLedger, run, shard_of
+from resource_usage import run_measured, format_usage
+from harvest import solver_cost, cost_fieldname
+
+map_names = ['ost003d', 'den520d', 'brc202d']
+
+
+def run_mdd_sat(params, output_path):
+    usage = run_measured([params['solver'], f'--output-file={output_path}', f'--bgu-input={params["instance_path"]}',
+                          '--cost-limit=65536', '--layer-limit=65536', '--makespan-limit=65536',
+                          f'--minisat-timeout={params["timeout"]}', f'--total-timeout={params["timeout"]}',
+                          '--encoding=mdd'],
+                         cpu_limit=params['cpu_limit'], memory_limit=params['memory_limit'], stdout=subprocess.DEVNULL)
+    if usage.cpu_limit_exceeded or usage.memory_limit_exceeded:
+        # Running out of CPU time or memory is a result, like a timeout. What the solver wrote is cut short.
+        cost = 0
+    else:
+        if usage.exit_status != 0:
+            raise RuntimeError(f'{params["solver"]} exited with status {usage.exit_status} ({usage.signal})')
+        if not os.path.exists(output_path):
+            raise RuntimeError(f'{params["solver"]} exited without writing an output file')
+        with open(output_path) as f:
+            cost = solver_cost(f.read().splitlines())
+    with open(output_path, 'a') as f:
+        f.write('\n' + format_usage(usage))
+        f.write(f'{cost_fieldname}: {cost}\n')
+        f.write('Total time (seconds): {}'.format(usage.wall_time))  # Last, where harvest.py looks for it
+    return cost != 0
+
+
+def censor(params, output_path):
+    """The output of a run that was skipped because easier instances failed - a failure at the timeout"""
+    with open(output_path, 'w') as f:
+        f.write('Censored: True\n')
+        f.write('Total time (seconds): {}'.format(params['timeout']))
+
+
+def jobs(args):
+    for agents in range(5, 85, 5):
+        for i in range(100):
+            for map_name in map_names:
+                job_id = f'{map_name}-{agents}-{i}'
+                if shard_of(job_id, args.num_shards) != args.shard:
+                    continue
+                instance_path = os.path.join(args.instances_dir, job_id)
+                yield job_id, f'{instance_path}_output.txt', {
+                    'instance_path': instance_path, 'solver': args.solver, 'timeout': args.timeout,
+                    'cpu_limit': args.cpu_limit if args.cpu_limit is not None else args.timeout + 60,
+                    'memory_limit': args.memory_limit * 1024 * 1024 if args.memory_limit is not None else None,
+                }, map_name, agents
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run MDD-SAT on the DAO map instances')
+    parser.add_argument('--shard', type=int, default=0, help="This machine's shard number, from 0")
+    parser.add_argument('--num-shards', type=int, default=1, help='The number of machines')
+    parser.add_argument('--instances-dir', default='/home/ubuntu')
+    parser.add_argument('--solver', default='./solver_reLOC')
+    parser.add_argument('--timeout', type=int, default=300, help='Seconds')
+    parser.add_argument('--cpu-limit', type=int, default=None,
+                        help='Seconds of CPU time before the solver is killed (default: the timeout + 60)')
+    parser.add_argument('--memory-limit', type=int, default=None, help='MB of address space the solver may use')
+    parser.add_argument('--ledger', default='mdd-sat-jobs.sqlite')
+    parser.add_argument('--jobs', type=int, default=None, help='Parallel runs (default: the number of CPUs)')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--min-success-rate', type=float, default=None,
+                        help="Skip a map's larger agent counts once the success rate drops below this")
+    parser.add_argument('--status', action='store_true', help="Just print the number of jobs in each state")
+    args = parser.parse_args()
+    if not 0 <= args.shard < args.num_shards:
+        parser.error('--shard must be between 0 and --num-shards - 1')
+
+    ledger = JobLedger(args.ledger)
+    if not args.status:
+        ledger.add(jobs(args))
+        start = time.time()
+        try:
+            run(ledger, run_mdd_sat, args.jobs, args.max_attempts, args.min_success_rate, censor)
+        except KeyboardInterrupt:
+            print('Interrupted - run again to resume')
+        print(f'Took {time.time() - start:.0f} seconds')
+    print(dict(ledger.counts()))
+    for job_id, attempts, error in ledger.failures():
+        print(f'{job_id} failed {attempts} times: {error}')
+    ledger.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+Run the C# benchmark as independent (scenario file, number of agents) jobs in a pool of processes.
+
+Usage: run_benchmark.py --solver "dotnet mapf.dll" -o Results.csv
+
+Like Program.cs's benchmark, each scenario is solved with its first 1, 2, 3... agents, and stops
+at the first number of agents no solver solves. Each job runs in its own process and writes its own
+results file, and jobs are started longest expected first. The agent counts of a scenario run one at
+a time, and a solver that timed out on one isn't run on the next, like in Program.cs, where a single
+Run solves them all with MAX_FAIL_COUNT = 1. When all jobs are finished, the per-job results are merged
+into a single CSV with the same header and rows Program.cs would have written.
+
+The jobs are kept in a ledger (see scheduler.py), so running it again resumes an interrupted benchmark.
+A job killed by its CPU or memory limit counts as unsolved by every solver, and is listed with its peak memory
+use in a "<output> limits.csv" report, to show which instances are CPU or memory bound.
+"""
+import os
+import csv
+import glob
+import shlex
+import argparse
+import subprocess
+
+import numpy as np
+
+from scheduler import JobLedger, run
+from resource_usage import run_measured, format_usage, read_usage, fieldnames as usage_fieldnames
+from results_cache import read_header
+from results import read_results
+
+scen_dirs = [os.path.join('..', '..', '..', 'scen', name) for name in ['scen-even', 'scen-random', 'scen-omri']]
+
+
+def scenario_agents(scen_path):
+    """The map name and the number of agents of a .scen file"""
+    map_name = None
+    num_agents = 0
+    with open(scen_path) as f:
+        next(f)  # Format version
+        for line in f:
+            if not line.strip():
+                break
+            map_name = line.split('\t')[1]
+            num_agents += 1
+    return _strip_map_suffix(map_name or ''), num_agents
+
+
+def _strip_map_suffix(grid_name):
+    return grid_name[:-len('.map')] if grid_name.endswith('.map') else grid_name
+
+
+def expected_runtimes(results_paths):
+    """A function from (grid name, number of agents) to the expected total runtime of a job, in ms"""
+    means = {}
+    for path in results_paths:
+        data = read_results(path, report_bad_rows=False)
+        runtimes = data['Runtime'].where(data['Ran']).sum(axis=1)
+        mean_runtimes = runtimes.groupby(level=['Grid Name', 'Num Of Agents']).mean()
+        for (grid_name, num_of_agents), mean in mean_runtimes.items():
+            means[_strip_map_suffix(grid_name), num_of_agents] = mean
+
+    def expected_runtime(grid_name, num_of_agents):
+        # Without a previous run to go by, more agents take longer
+        return means.get((grid_name, num_of_agents), num_of_agents ** 2)
+    return expected_runtime
+
+
+class SolverError(RuntimeError):
+    """The solver exited with an error, other than by running out of CPU time or memory"""
+
+
+def timed_out_solvers(results_path):
+    """
+    The indices of the solvers that timed out or were skipped in a job's results file - the ones Run.SolveGivenProblem
+    wouldn't run on the next number of agents, with MAX_FAIL_COUNT = 1. None if the file has no results.
+    """
+    with open(results_path, newline='') as f:
+        rows = list(csv.reader(f))
+    if len(rows) < 2:  # Censored, or killed by its CPU or memory limit
+        return None
+    header, row = rows[0], rows[-1]
+    # A solver's Success, Runtime and Solution Cost columns are always first, in that order - see Run.PrintStatistics
+    cost_positions = [position + 2 for position, fieldname in enumerate(header[:-2]) if fieldname.endswith(' Success')
+                      and header[position + 2] == fieldname[:-len(' Success')] + ' Solution Cost']
+    timeout_cost = '-2'  # Constants.SpecialCosts.TIMEOUT_COST
+    return [i for i, position in enumerate(cost_positions) if row[position] in (timeout_cost, 'irrelevant')]
+
+
+def run_job(params, output_path):
+    """
+    Run the C# solvers on one job. Returns whether any of them solved it, like Run.SolveGivenProblem.
+    Solvers that timed out on the job's previous number of agents are skipped, if its results are given.
+    """
+    command = params['command'] + ['--scen', params['scen_path'], '--agents', str(params['num_agents']),
+                                   '--results', os.path.abspath(output_path)]
+    previous_path = params.get('previous_output_path')
+    skipped = timed_out_solvers(previous_path) if previous_path and os.path.exists(previous_path) else None
+    if skipped:
+        command += ['--skip-solvers', ','.join(map(str, skipped))]
+    with open(output_path + '.log', 'w') as log:
+        usage = run_measured(command,
+                             cpu_limit=params['cpu_limit'], memory_limit=params['memory_limit'],
+                             stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                             cwd=params['working_dir'])
+        log.write('\n' + format_usage(usage))
+    os.replace(output_path + '.log', params['log_path'])
+    if usage.cpu_limit_exceeded or usage.memory_limit_exceeded:
+        open(output_path, 'w').close()  # Drop whatever it wrote before it was killed - no solver solved it
+        return False
+    if usage.exit_status != 0:
+        raise SolverError(f'exited with status {usage.exit_status} ({usage.signal}) - see {params["log_path"]}')
+    header = read_header(output_path)
+    success_positions = [position for position, fieldname in enumerate(header) if fieldname.endswith(' Success')]
+    rows = np.loadtxt(output_path, delimiter=',', skiprows=1, usecols=success_positions, dtype=str, ndmin=2)
+    return bool((rows == '1').any())
+
+
+def censor(params, output_path):
+    """Like Program.cs, write no results for agent counts above one no solver solved"""
+    open(output_path, 'w').close()
+
+
+limit_usage_fields = ['cpu_limit_exceeded', 'memory_limit_exceeded', 'peak_rss_kb', 'user_time', 'system_time']
+
+
+def write_limits_report(jobs, report_path):
+    """
+    Write the (job id, params) jobs that were killed by their CPU or memory limit to a CSV, with their usage.
+    Returns the number of such jobs.
+    """
+    rows = []
+    for job_id, params in jobs:
+        usage = read_usage(params['log_path'])
+        if usage is not None and (usage.cpu_limit_exceeded or usage.memory_limit_exceeded):
+            rows.append([job_id, params['scen_path'], params['num_agents']] +
+                        [int(value) if isinstance(value, bool) else value
+                         for value in (getattr(usage, field) for field in limit_usage_fields)])
+    temp_path = report_path + '.tmp'
+    with open(temp_path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['Job', 'Scenario', 'Num Of Agents'] +
+                        [usage_fieldnames[field] for field in limit_usage_fields])
+        writer.writerows(rows)
+    os.replace(temp_path, report_path)
+    return len(rows)
+
+
+def merge(paths, output_path):
+    """Concatenate per-job results files, which must have the same header, into one results file"""
+    header_line = None
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'w', newline='') as output_file:
+        for path in paths:
+            with open(path, newline='') as f:
+                first_line = f.readline()
+                if not first_line:
+                    continue  # A skipped job
+                if header_line is None:
+                    header_line = first_line
+                    output_file.write(header_line)
+                elif first_line != header_line:
+                    raise ValueError(f'{path} has different columns than the files before it')
+                output_file.writelines(f)
+    os.replace(temp_path, output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the C# benchmark in parallel processes')
+    parser.add_argument('--solver', required=True, help='The command that runs Program.cs, like "dotnet mapf.dll"')
+    parser.add_argument('--scen-dirs', nargs='+', default=scen_dirs)
+    parser.add_argument('--working-dir', default='.', help='Where to run the solver - the scenario paths are '
+                                                           'relative to it')
+    parser.add_argument('-o', '--output', default='Results.csv', help='The merged results CSV')
+    parser.add_argument('--jobs-dir', default='benchmark-jobs', help='Where the per-job results files go')
+    parser.add_argument('--estimates', nargs='*', default=[],
+                        help='Results CSVs of a previous run, to order the jobs by their expected runtime')
+    parser.add_argument('--jobs', type=int, default=None, help='Parallel runs (default: the number of CPUs)')
+    parser.add_argument('--cpu-limit', type=int, default=None, help='Seconds of CPU time per job')
+    parser.add_argument('--memory-limit', type=int, default=None, help='MB of address space per job')
+    parser.add_argument('--max-attempts', type=int, default=2)
+    parser.add_argument('--run-all-agent-counts', action='store_true',
+                        help="Don't stop a scenario at the first number of agents no solver solves")
+    args = parser.parse_args()
+
+    os.makedirs(args.jobs_dir, exist_ok=True)
+    expected_runtime = expected_runtimes(args.estimates)
+    jobs = []
+    for scen_dir in args.scen_dirs:
+        for scen_path in sorted(glob.glob(os.path.join(args.working_dir, scen_dir, '*'))):
+            grid_name, num_agents = scenario_agents(scen_path)
+            scen_name = f'{os.path.basename(os.path.normpath(scen_dir))}-{os.path.basename(scen_path)}'
+            for agents in range(1, num_agents + 1):
+                job_id = f'{scen_name}-{agents}'
+                jobs.append((job_id, os.path.join(args.jobs_dir, job_id + '.csv'), {
+                    'command': shlex.split(args.solver), 'working_dir': args.working_dir,
+                    'scen_path': os.path.relpath(scen_path, args.working_dir), 'num_agents': agents,
+                    'previous_output_path': os.path.join(args.jobs_dir, f'{scen_name}-{agents - 1}.csv')
+                                            if agents > 1 else None,
+                    'log_path': os.path.join(args.jobs_dir, job_id + '.log'),
+                    'cpu_limit': args.cpu_limit,
+                    'memory_limit': args.memory_limit * 1024 * 1024 if args.memory_limit is not None else None,
+                }, scen_path, agents, expected_runtime(grid_name, agents)))
+    merge_order = [output_path for _, output_path, _, _, _, _ in jobs]
+
+    ledger = JobLedger(os.path.join(args.jobs_dir, 'ledger.sqlite'))
+    ledger.add(job[:5] for job in sorted(jobs, key=lambda job: job[5], reverse=True))
+    try:
+        # Even when running all of them, a scenario's agent counts run in order, so timeouts carry over
+        run(ledger, run_job, args.jobs, args.max_attempts,
+            min_success_rate=0 if args.run_all_agent_counts else 1, censor=censor)
+    except KeyboardInterrupt:
+        print('Interrupted - run again to resume')
+        return
+    finally:
+        counts = ledger.counts()
+        for job_id, attempts, error in ledger.failures():
+            print(f'{job_id} failed {attempts} times: {error}')
+        ledger.close()
+    print(dict(counts))
+    report_path = os.path.splitext(args.output)[0] + ' limits.csv'
+    num_killed = write_limits_report([(job_id, params) for job_id, _, params, _, _, _ in jobs], report_path)
+    if num_killed:
+        print(f'{num_killed} jobs were killed by their CPU or memory limit - see {report_path}')
+    if counts['pending'] or counts['running'] or counts['failed']:
+        print(f'Not merging into {args.output} until all jobs are done')
+        return
+    merge([path for path in merge_order if os.path.exists(path)], args.output)
+    print(f'Merged the results into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+A resumable scheduler for long experiment campaigns.
+
+Every job is recorded in a SQLite ledger with its state - pending, running, done or failed - and the number
+of times it was attempted. A job's output is written to a temporary file that is only renamed to the
+job's output path when the job succeeds, so an existing output always comes from a complete run.
+
+Restarting after a crash or an interrupt resumes the campaign: jobs that were running go back to pending,
+done jobs whose output went missing are run again, and failed jobs are retried up to a maximum number
+of attempts. Jobs are split between machines by a hash of their id, so every machine running the same
+campaign with the same number of shards gets a disjoint, stable part of it.
+
+Jobs can belong to a series - say, a solver on a map - at some level of difficulty - say, the number
+of agents. With a minimum success rate, the levels of each series run in increasing order, and once
+the success rate at a level drops below the minimum, the series' harder jobs are skipped. Skipped jobs
+still get an output, written by a censor function, so they're counted as failures rather than missing.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+def shard_of(job_id, num_shards):
+    """A stable shard number for the given job id - unlike hash(), it doesn't change between runs"""
+    return int.from_bytes(hashlib.blake2b(job_id.encode(), digest_size=8).digest(), 'big') % num_shards
+
+
+class JobLedger:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                output_path TEXT NOT NULL,
+                params TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated REAL)''')
+            columns = [name for _, name, *_ in self.connection.execute('PRAGMA table_info(jobs)')]
+            for column, column_type in [('series', 'TEXT'), ('level', 'INTEGER'), ('solved', 'INTEGER')]:
+                if column not in columns:  # A ledger from before series were supported
+                    self.connection.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+
+    def add(self, jobs):
+        """
+        Add (id, output path, params, series, level) jobs as pending. Series and level may be None.
+        Jobs that are already in the ledger are kept as they are.
+        """
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO jobs (id, output_path, params, series, level, updated) '
+                                        'VALUES (?, ?, ?, ?, ?, ?)',
+                                        ((job_id, output_path, json.dumps(params), series, level, time.time())
+                                         for job_id, output_path, params, series, level in jobs))
+
+    def recover(self):
+        """
+        Return jobs that a crashed or interrupted run left running to pending, and also done jobs whose output
+        was deleted. Returns the ids of the jobs that were returned to pending.
+        """
+        recovered = [job_id for job_id, in self.connection.execute('SELECT id FROM jobs WHERE state = ?', (RUNNING,))]
+        recovered += [job_id for job_id, output_path in
+                      self.connection.execute('SELECT id, output_path FROM jobs WHERE state = ?', (DONE,))
+                      if not os.path.exists(output_path)]
+        with self.connection:
+            self.connection.executemany('UPDATE jobs SET state = ?, updated = ? WHERE id = ?',
+                                        ((PENDING, time.time(), job_id) for job_id in recovered))
+        return recovered
+
+    def runnable(self, max_attempts):
+        """
+        (id, output path, params, series, level) of pending jobs and failed jobs with attempts left,
+        in the order they were added
+        """
+        return [(job_id, output_path, json.loads(params), series, level)
+                for job_id, output_path, params, series, level in self.connection.execute(
+                    'SELECT id, output_path, params, series, level FROM jobs '
+                    'WHERE state = ? OR (state = ? AND attempts < ?) ORDER BY rowid',
+                    (PENDING, FAILED, max_attempts))]
+
+    def start(self, job_id):
+        with self.connection:
+            self.connection.execute('UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? WHERE id = ?',
+                                    (RUNNING, time.time(), job_id))
+
+    def finish(self, job_id, error=None, solved=None):
+        with self.connection:
+            self.connection.execute('UPDATE jobs SET state = ?, error = ?, solved = ?, updated = ? WHERE id = ?',
+                                    (FAILED if error is not None else DONE, error, solved, time.time(), job_id))
+
+    def skip(self, job_ids):
+        with self.connection:
+            self.connection.executemany('UPDATE jobs SET state = ?, solved = 0, updated = ? WHERE id = ?',
+                                        ((SKIPPED, time.time(), job_id) for job_id in job_ids))
+
+    def series(self):
+        return [series for series, in
+                self.connection.execute('SELECT DISTINCT series FROM jobs WHERE series IS NOT NULL')]
+
+    def levels(self, series, max_attempts):
+        """(level, number of jobs, number solved, number unfinished) of each level of the given series, in order"""
+        return list(self.connection.execute(
+            'SELECT level, COUNT(*), COALESCE(SUM(solved = 1), 0), '  # solved is NULL for failed jobs
+            'SUM(state IN (?, ?) OR (state = ? AND attempts < ?)) '
+            'FROM jobs WHERE series = ? GROUP BY level ORDER BY level',
+            (PENDING, RUNNING, FAILED, max_attempts, series)))
+
+    def harder_runnable(self, series, level, max_attempts):
+        """(id, output path, params) of the runnable jobs of the given series above the given level"""
+        return [(job_id, output_path, json.loads(params)) for job_id, output_path, params in self.connection.execute(
+            'SELECT id, output_path, params FROM jobs WHERE series = ? AND level > ? '
+            'AND (state = ? OR (state = ? AND attempts < ?))',
+            (series, level, PENDING, FAILED, max_attempts))]
+
+    def attempts(self, job_id):
+        return self.connection.execute('SELECT attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+
+    def counts(self):
+        """The number of jobs in each state"""
+        return Counter(dict(self.connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state')))
+
+    def failures(self):
+        """(id, attempts, error) of the failed jobs"""
+        return list(self.connection.execute('SELECT id, attempts, error FROM jobs WHERE state = ? ORDER BY rowid',
+                                            (FAILED,)))
+
+    def close(self):
+        self.connection.close()
+
+
+def _run_job(worker, params, output_path):
+    """Run a job in a worker process, writing its output to a temporary file that's renamed when it succeeds"""
+    temp_path = f'{output_path}.{os.getpid()}.tmp'
+    try:
+        solved = worker(params, temp_path)
+        os.replace(temp_path, output_path)
+        return solved
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _prune(ledger, series, min_success_rate, max_attempts, censor):
+    """
+    Skip the harder jobs of the given series if it has a finished level with a success rate below the minimum.
+    Returns the ids of the skipped jobs.
+    """
+    for level, num_jobs, num_solved, num_unfinished in ledger.levels(series, max_attempts):
+        if num_unfinished:
+            return []
+        if num_solved / num_jobs < min_success_rate:
+            skipped = ledger.harder_runnable(series, level, max_attempts)
+            for job_id, output_path, params in skipped:
+                _run_job(censor, params, output_path)
+            ledger.skip(job_id for job_id, _, _ in skipped)
+            if skipped:
+                print(f'{series}: solved {num_solved}/{num_jobs} at level {level} - skipped {len(skipped)} harder jobs')
+            return [job_id for job_id, _, _ in skipped]
+    return []
+
+
+def run(ledger, worker, processes=None, max_attempts=3, min_success_rate=None, censor=None):
+    """
+    Run the runnable jobs of the ledger in a process pool until each is done, out of attempts or skipped.
+
+    Jobs are started in the order they were added to the ledger, so add the longest ones first.
+    worker(params, output_path) is called in a worker process for each job, and should write the job's output
+    to the given path and raise on failure. It must be picklable - a module-level function. It may return
+    whether the job's problem was solved, which is what min_success_rate is about.
+
+    With a min_success_rate, each series only runs one level at a time, from the lowest. When a level
+    finishes with a lower success rate, the series' runnable jobs at higher levels are skipped, and
+    censor(params, output_path) is called to write each skipped job's output.
+    """
+    for job_id in ledger.recover():
+        print(f'{job_id} was interrupted or its output is missing - will run it again')
+    adaptive = min_success_rate is not None
+    if adaptive:
+        for series in ledger.series():
+            _prune(ledger, series, min_success_rate, max_attempts, censor)
+    queue = deque(ledger.runnable(max_attempts))
+    print(f'{len(queue)} jobs to run')
+    in_flight = {}
+    processes = processes or os.cpu_count()
+
+    def frontiers():
+        """The level each series is at - the lowest level with jobs that aren't finished"""
+        lowest = {}
+        for _, _, _, series, level in list(queue) + list(in_flight.values()):
+            if series is not None and (series not in lowest or level < lowest[series]):
+                lowest[series] = level
+        return lowest
+
+    with ProcessPoolExecutor(processes) as executor:
+        try:
+            while queue or in_flight:
+                frontier = frontiers() if adaptive else {}
+                for job in list(queue):
+                    if len(in_flight) >= processes:
+                        break
+                    job_id, output_path, params, series, level = job
+                    if series in frontier and level != frontier[series]:
+                        continue  # Wait for the series' easier jobs
+                    queue.remove(job)
+                    ledger.start(job_id)
+                    in_flight[executor.submit(_run_job, worker, params, output_path)] = job
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = in_flight.pop(future)
+                    job_id, series = job[0], job[3]
+                    error = future.exception()
+                    if isinstance(error, BrokenProcessPool):
+                        raise error
+                    if error is None:
+                        ledger.finish(job_id, solved=future.result())
+                        print(f'{job_id} done')
+                    else:
+                        ledger.finish(job_id, repr(error))
+                        print(f'{job_id} failed: {error!r}')
+                        if ledger.attempts(job_id) < max_attempts:
+                            queue.append(job)
+                    if adaptive and series is not None:
+                        skipped = set(_prune(ledger, series, min_success_rate, max_attempts, censor))
+                        queue = deque(job for job in queue if job[0] not in skipped)
+        except (KeyboardInterrupt, BrokenProcessPool):
+            # Jobs still in flight stay marked as running, and are recovered by the next run.
+            # (Not shutdown's cancel_futures, which needs Python 3.9 - see the Pipfile.)
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False)
+            raise
+    return ledger.counts()
@@ -0,0 +1,159 @@
+"""
+Predict the fastest solvers for an instance from the results of similar instances.
+
+Usage: select_solver.py train Results.csv ... --instances-dir ../../../Instances -o selector.npz
+       select_solver.py predict selector.npz instance files... [--portfolio 2]
+       select_solver.py evaluate selector.npz [--portfolio 2]
+
+The selector is a k-nearest-neighbors model over instance features (see instance_features.py), standardized so
+each feature counts the same. A solver's predicted score on an instance is the mean log runtime it had on the
+k most similar training instances it was run on, where a failure counts as PENALTY times the time limit, like
+in a PAR10 score. The solvers with the lowest predicted scores are the ones to run.
+
+evaluate does a leave-one-out test on the training instances: for each, the selector is trained on all the
+others, and the best runtime of the solvers it picks is compared with the best runtime of any solver and with
+the runtime of the solver that's best overall.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from instance_features import feature_names, results_features, instance_features, load_instance_file
+from results import read_results, concat_results, MAX_TIME
+
+PENALTY = 10
+
+
+def penalized_runtimes(data):
+    """A (instances x solvers) DataFrame of runtimes, with failures as PENALTY * MAX_TIME and NaN where not run"""
+    runtimes = data['Runtime'].where(data['Success'], PENALTY * MAX_TIME)
+    return runtimes.where(data['Ran']).astype(np.float64)
+
+
+class Selector:
+    def __init__(self, features, scores, solvers, k=10):
+        """features is an (instances x features) array, scores an (instances x solvers) array of log runtimes"""
+        self.features = np.asarray(features, dtype=np.float64)
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.solvers = list(solvers)
+        self.k = k
+        self.mean = self.features.mean(axis=0)
+        self.std = self.features.std(axis=0)
+        self.std[self.std == 0] = 1
+        self.scaled = (self.features - self.mean) / self.std
+        self.squared_norms = (self.scaled ** 2).sum(axis=1)
+
+    def predict_scores(self, features, exclude=None, chunk_size=None):
+        """
+        The predicted log runtime of each solver on each of the given (instances x features) instances.
+        exclude optionally gives a training instance to leave out for each instance, for leave-one-out tests.
+        By default, instances are predicted in chunks whose distances to the training instances take about 64 MB.
+        """
+        features = (np.atleast_2d(np.asarray(features, dtype=np.float64)) - self.mean) / self.std
+        predictions = np.empty((len(features), len(self.solvers)))
+        if chunk_size is None:
+            chunk_size = max(1, 2 ** 23 // max(len(self.scaled), 1))
+        for start in range(0, len(features), chunk_size):
+            chunk = features[start:start + chunk_size]
+            # Squared distances as |a|^2 + |b|^2 - 2ab, with a single matrix product
+            distances = (chunk ** 2).sum(axis=1)[:, np.newaxis] + self.squared_norms - 2 * (chunk @ self.scaled.T)
+            np.maximum(distances, 0, out=distances)  # Rounding can make the distance of equal instances negative
+            if exclude is not None:
+                distances[np.arange(len(chunk)), exclude[start:start + chunk_size]] = np.inf
+            # Per solver, average over the nearest training instances it was run on
+            ran = ~np.isnan(self.scores)
+            for j in range(len(self.solvers)):
+                solver_distances = np.where(ran[:, j], distances, np.inf)
+                k = min(self.k, int(ran[:, j].sum()))
+                if k == 0:
+                    predictions[start:start + len(chunk), j] = np.inf
+                    continue
+                nearest = np.argpartition(solver_distances, k - 1, axis=1)[:, :k]
+                nearest_scores = np.where(np.isfinite(np.take_along_axis(solver_distances, nearest, axis=1)),
+                                          self.scores[nearest, j], np.nan)
+                with np.errstate(invalid='ignore'):
+                    predictions[start:start + len(chunk), j] = np.nan_to_num(np.nanmean(nearest_scores, axis=1),
+                                                                             nan=np.inf)
+        return predictions
+
+    def select(self, features, portfolio=1, exclude=None):
+        """The indices of the portfolio solvers predicted fastest on each of the given instances, fastest first"""
+        return np.argsort(self.predict_scores(features, exclude), axis=1, kind='stable')[:, :portfolio]
+
+    def save(self, path):
+        np.savez(path, features=self.features, scores=self.scores, solvers=np.array(self.solvers), k=self.k,
+                 feature_names=np.array(feature_names))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as model:
+            if list(model['feature_names']) != feature_names:
+                raise ValueError(f'{path} was trained with different features')
+            return cls(model['features'], model['scores'], list(model['solvers']), int(model['k']))
+
+
+def training_set(results_paths, instances_dir, maps_dir=None, processes=None):
+    """The features and the penalized runtimes of the instances of the given results CSVs"""
+    data = concat_results([read_results(path) for path in results_paths])
+    data = data[~data.index.duplicated(keep='last')]
+    features = results_features(data, instances_dir, maps_dir, processes)
+    return features, penalized_runtimes(data).loc[features.index]
+
+
+def evaluate(selector, portfolio=1):
+    """Leave-one-out totals of the best runtimes of the selected solvers, of the virtual best and the single best"""
+    runtimes = np.power(10, selector.scores)  # NaN where not run
+    chosen = selector.select(selector.features, portfolio, exclude=np.arange(len(selector.features)))
+    chosen_runtimes = np.take_along_axis(np.nan_to_num(runtimes, nan=PENALTY * MAX_TIME), chosen, axis=1).min(axis=1)
+    single_best = np.nanargmin(np.nanmean(runtimes, axis=0))
+    return {
+        'instances': len(runtimes),
+        'selected': chosen_runtimes.sum(),
+        'virtual best': np.nanmin(runtimes, axis=1).sum(),
+        f'single best ({selector.solvers[single_best]})': np.nan_to_num(runtimes[:, single_best],
+                                                                         nan=PENALTY * MAX_TIME).sum(),
+        'selected solved': int((chosen_runtimes < PENALTY * MAX_TIME).sum()),
+        'virtual best solved': int((np.nanmin(runtimes, axis=1) < PENALTY * MAX_TIME).sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train and use a per-instance solver selector')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help='Train a selector on results CSVs')
+    train_parser.add_argument('results', nargs='+')
+    train_parser.add_argument('--instances-dir', default='../../../Instances')
+    train_parser.add_argument('--maps-dir', default=None)
+    train_parser.add_argument('-k', type=int, default=10, help='Neighbors to average')
+    train_parser.add_argument('-o', '--output', default='selector.npz')
+    train_parser.add_argument('--jobs', type=int, default=None)
+    predict_parser = subparsers.add_parser('predict', help='Pick solvers for instance files')
+    predict_parser.add_argument('model')
+    predict_parser.add_argument('instances', nargs='+')
+    predict_parser.add_argument('--agents', type=int, default=None, help='Use only the first agents of each instance')
+    predict_parser.add_argument('--maps-dir', default=None)
+    predict_parser.add_argument('--portfolio', type=int, default=1, help='Solvers to pick per instance')
+    evaluate_parser = subparsers.add_parser('evaluate', help='Leave-one-out test of a selector')
+    evaluate_parser.add_argument('model')
+    evaluate_parser.add_argument('--portfolio', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        features, runtimes = training_set(args.results, args.instances_dir, args.maps_dir, args.jobs)
+        selector = Selector(features.to_numpy(), np.log10(np.maximum(runtimes.to_numpy(), 1)), runtimes.columns, args.k)
+        selector.save(args.output)
+        print(f'Trained on {len(features)} instances and {len(selector.solvers)} solvers into {args.output}')
+    elif args.command == 'predict':
+        selector = Selector.load(args.model)
+        for path in args.instances:
+            features = instance_features(load_instance_file(path, args.agents, args.maps_dir))
+            chosen = selector.select(features, args.portfolio)[0]
+            print(f'{path}: {", ".join(selector.solvers[j] for j in chosen)}')
+    else:
+        selector = Selector.load(args.model)
+        print(pd.Series(evaluate(selector, args.portfolio)).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Split a results CSV into one file per combination of key values, reading the input only once.
+
+Usage: split_results.py input.csv --by grid --by depth --by agents
+
+The input is streamed in chunks of text, so rows are copied exactly and memory use is bounded.
+Rows are buffered per output file and appended to it in batches through a bounded pool of open files,
+so any number of output files can be written without running out of file descriptors.
+"""
+import os.path
+import argparse
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from results_cache import read_header, read_table
+
+
+class FilePool:
+    """Keeps at most max_open files open for appending, closing the least recently used when another is needed"""
+    def __init__(self, max_open):
+        self.max_open = max_open
+        self.files = OrderedDict()
+
+    def get(self, path):
+        f = self.files.pop(path, None)
+        if f is None:
+            if len(self.files) >= self.max_open:
+                _, least_recently_used = self.files.popitem(last=False)
+                least_recently_used.close()
+            f = open(path, 'a', newline='')
+        self.files[path] = f
+        return f
+
+    def close(self):
+        while self.files:
+            _, f = self.files.popitem()
+            f.close()
+
+
+def solution_depths(header, chunk):
+    """Each row's first solution depth that isn't -1 or "irrelevant", or -1 if there's none"""
+    positions = [position for position, fieldname in enumerate(header) if fieldname.endswith(" Solution Depth")]
+    depths = chunk[positions].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float).reshape(len(chunk), -1)
+    known = ~np.isnan(depths) & (depths != -1)
+    return np.where(known.any(axis=1), depths[np.arange(len(chunk)), known.argmax(axis=1)], -1).astype(int)
+
+
+# Short key names, with how to compute them from a chunk and how they appear in output file names
+keys = {
+    'grid': (lambda header, chunk: chunk[header.index('Grid Name')].to_numpy(), '{}'),
+    'depth': (solution_depths, 'depth{}'),
+    'agents': (lambda header, chunk: chunk[header.index('Num Of Agents')].to_numpy(), 'agents{}'),
+}
+
+
+def _key_values(key, header, chunk):
+    if key in keys:
+        return keys[key][0](header, chunk)
+    return chunk[header.index(key)].to_numpy()  # Any other column, by name
+
+
+def split(input_path, by, chunksize=50000, buffer_rows=5000, max_buffered_rows=200000, max_open_files=64,
+          columnar=False):
+    """
+    Split the given results CSV by the given keys - short names from `keys` or column names.
+    Output files are named "<input path without extension>_<key value>_<key value>...csv".
+    With columnar=True, the typed, memory-mapped cache of each output file is built too.
+    Returns the paths of the output files.
+    """
+    input_filename = os.path.splitext(input_path)[0]
+    header = read_header(input_path)
+    header_line = ','.join(header) + '\n'
+
+    def output_path(values):
+        return f'{input_filename}_' + '_'.join((keys[key][1] if key in keys else '{}').format(value)
+                                                for key, value in zip(by, values)) + '.csv'
+
+    output_paths = []
+    buffers = defaultdict(list)
+    buffered_row_counts = defaultdict(int)
+    pool = FilePool(max_open_files)
+
+    def flush(path):
+        f = pool.get(path)
+        pd.concat(buffers.pop(path)).to_csv(f, header=False, index=False)
+        del buffered_row_counts[path]
+
+    try:
+        for chunk in pd.read_csv(input_path, header=None, skiprows=1, dtype=str, keep_default_na=False,
+                                 chunksize=chunksize):
+            key_values = [_key_values(key, header, chunk) for key in by]
+            for values, rows in chunk.groupby(key_values, sort=False):
+                path = output_path(values)
+                if path not in output_paths:  # Truncate any previous output and write the header
+                    output_paths.append(path)
+                    with open(path, 'w', newline='') as f:
+                        f.write(header_line)
+                buffers[path].append(rows)
+                buffered_row_counts[path] += len(rows)
+            for path, count in list(buffered_row_counts.items()):
+                if count >= buffer_rows:
+                    flush(path)
+            if sum(buffered_row_counts.values()) > max_buffered_rows:
+                for path in list(buffers):
+                    flush(path)
+        for path in list(buffers):
+            flush(path)
+    finally:
+        pool.close()
+
+    if columnar:
+        for path in output_paths:
+            read_table(path)
+    return output_paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Split a results CSV by any combination of keys in a single read')
+    parser.add_argument('input_path')
+    parser.add_argument('--by', action='append', required=True, metavar='KEY',
+                        help=f'A key to split by: {", ".join(keys)} or any column name. May be repeated.')
+    parser.add_argument('--columnar', action='store_true',
+                        help='Also store each output file in the typed, memory-mapped format of results_cache.py')
+    parser.add_argument('--max-open-files', type=int, default=64)
+    parser.add_argument('--buffer-rows', type=int, default=5000, help='Rows to buffer per output file before writing')
+    args = parser.parse_args(argv)
+    for path in split(args.input_path, args.by, buffer_rows=args.buffer_rows, max_open_files=args.max_open_files,
+                      columnar=args.columnar):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
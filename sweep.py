@@ -0,0 +1,247 @@
+"""
+Tune CBS's options by successive halving, instead of running every configuration on every instance.
+
+Usage: sweep.py --solver "dotnet mapf.dll" --param mergeThreshold=5,50,256 --param mergeCausesRestart=false,true
+                [--param bypassStrategy=NONE,FIRST_FIT_LOOKAHEAD] [--agents 10 20 30] [--budget 10] [--eta 3]
+
+Each --param lists values of a parameter of CBS's constructor, and the configurations are all their combinations.
+A configuration is run as the single solver of Program.cs, with its --config option (see Run.ConfiguredCbs), on
+one (scenario, number of agents) instance per job, like in run_benchmark.py.
+
+The instances are shuffled once, with a fixed seed. In the first rung, every configuration is run on the first
+--budget instances. When a rung is done, the configurations are scored by their mean penalized runtime - a failure
+counts as --penalty times the time limit (PAR10), so the score weighs both runtime and success - and the best
+1/eta of them go on to the next rung, which runs them on eta times as many instances. A rung's instances include
+the ones of the rungs before it, so the results of every two configurations are always paired. A configuration
+whose penalized runtimes are worse than the leader's on the same instances by a paired Wilcoxon signed-rank test
+is dominated, and is dropped even if it's in the best 1/eta. The sweep ends when a single configuration is left
+or a rung ran on all the instances. A run that exits with an error - like one killed by the memory limit, or one
+whose combination of options makes the solver throw - is a failure of its configuration, like a timeout.
+
+The jobs are kept in a ledger (see scheduler.py), so running the sweep again with the same arguments resumes it and
+reuses every run it already made. The scores of each rung are written to rungs.csv in the jobs directory. At the
+end, the CPU time of the sweep is compared with the CPU time a full grid of every configuration on every instance
+would take, estimated by the sweep's mean CPU time per run.
+"""
+import os
+import csv
+import glob
+import math
+import shlex
+import hashlib
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from scheduler import JobLedger, run
+from resource_usage import read_usage
+from compare_results import wilcoxon_signed_rank
+from run_benchmark import run_job, SolverError, scen_dirs, scenario_agents
+from results import MAX_TIME
+
+
+def parse_param(text):
+    """A --param argument, like "mergeThreshold=5,50,256", as its name and list of values"""
+    name, _, values = text.partition('=')
+    if not name.strip() or not values.strip():
+        raise argparse.ArgumentTypeError(f'expected name=value,value,...: {text}')
+    return name.strip(), [value.strip() for value in values.split(',')]
+
+
+def configurations(params):
+    """Every combination of the values of the (name, values) params, as a configuration for Run.ConfiguredCbs"""
+    names = [name for name, _ in params]
+    return [','.join(f'{name}={value}' for name, value in zip(names, values))
+            for values in itertools.product(*(values for _, values in params))]
+
+
+def configuration_id(configuration):
+    """A short, stable id of a configuration, for job ids and file names"""
+    return hashlib.blake2b(configuration.encode(), digest_size=5).hexdigest()
+
+
+def shuffled_instances(scen_paths, agent_counts, seed):
+    """The (scenario path, number of agents) instances of the given scenarios that have enough agents, shuffled"""
+    instances = []
+    for scen_path in scen_paths:
+        _, num_agents = scenario_agents(scen_path)
+        instances += [(scen_path, agents) for agents in agent_counts if agents <= num_agents]
+    order = np.random.default_rng(seed).permutation(len(instances))
+    return [instances[i] for i in order]
+
+
+def run_configuration(params, output_path):
+    """
+    Like run_benchmark.run_job, but a solver that exits with an error just doesn't solve the instance.
+    The error can't be fixed by running it again, so it shouldn't fail the job.
+    """
+    try:
+        return run_job(params, output_path)
+    except SolverError:
+        open(output_path, 'w').close()
+        return False
+
+
+def read_run(output_path, log_path):
+    """
+    Whether a job solved its instance, the solver's runtime in ms, the job's CPU time in seconds and whether the
+    solver exited with an error
+    """
+    solved, runtime = False, np.nan
+    with open(output_path, newline='') as f:
+        rows = list(csv.reader(f))
+    if len(rows) >= 2:  # Empty if the solver was killed or exited with an error
+        row = dict(zip(rows[0], rows[1]))
+        solved = any(value == '1' for fieldname, value in row.items() if fieldname.endswith(' Success'))
+        runtimes = [value for fieldname, value in row.items() if fieldname.endswith(' Runtime')]
+        runtime = float(runtimes[0]) if runtimes else np.nan
+    usage = read_usage(log_path)
+    if usage is None:
+        return solved, runtime, np.nan, False
+    crashed = usage.exit_status != 0 and not (usage.cpu_limit_exceeded or usage.memory_limit_exceeded)
+    return solved, runtime, usage.user_time + usage.system_time, crashed
+
+
+def rank(penalized, eta, alpha):
+    """
+    Score the configurations of a rung by their (instances x configurations) penalized runtimes.
+    Returns a frame of their scores from best to worst, with which are dominated and which are kept.
+    """
+    means = penalized.mean().sort_values(kind='stable')
+    leader = means.index[0]
+    p_values = pd.Series({configuration: 1.0 if configuration == leader else
+                          wilcoxon_signed_rank(penalized[configuration] - penalized[leader])
+                          for configuration in means.index})
+    scores = pd.DataFrame({'Penalized Runtime': means, 'p-value': p_values[means.index]})
+    scores['Dominated'] = (scores['p-value'] < alpha) & (means > means[leader])
+    scores['Kept'] = (np.arange(len(means)) < max(1, math.ceil(len(means) / eta))) & ~scores['Dominated']
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune CBS's options by successive halving over instances")
+    parser.add_argument('--solver', required=True, help='The command that runs Program.cs, like "dotnet mapf.dll"')
+    parser.add_argument('--param', type=parse_param, action='append', required=True, dest='params',
+                        help='A parameter of the CBS constructor and the values to try, like mergeThreshold=5,50,256. '
+                             'Also lowLevel=astar,astar_with_od,epea and heuristic=none,mvc,mddPruning')
+    parser.add_argument('--scen-dirs', nargs='+', default=scen_dirs)
+    parser.add_argument('--working-dir', default='.', help='Where to run the solver - the scenario paths are '
+                                                           'relative to it')
+    parser.add_argument('--agents', type=int, nargs='+', default=[10, 20, 30, 40, 50],
+                        help='The numbers of agents to take from each scenario')
+    parser.add_argument('--budget', type=int, default=10, help='Instances per configuration in the first rung')
+    parser.add_argument('--eta', type=int, default=3, help='Keep the best 1/eta configurations after each rung, '
+                                                           'and run them on eta times as many instances')
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help='Significance level of the paired test that drops dominated configurations')
+    parser.add_argument('--time-limit', type=float, default=MAX_TIME, help='Constants.MAX_TIME, in ms')
+    parser.add_argument('--penalty', type=float, default=10, help='A failure counts as this many time limits')
+    parser.add_argument('--seed', type=int, default=0, help='Of the order of the instances')
+    parser.add_argument('--jobs-dir', default='sweep-jobs', help='Where the per-job results files go')
+    parser.add_argument('--jobs', type=int, default=None, help='Parallel runs (default: the number of CPUs)')
+    parser.add_argument('--cpu-limit', type=int, default=None, help='Seconds of CPU time per job')
+    parser.add_argument('--memory-limit', type=int, default=None, help='MB of address space per job')
+    parser.add_argument('--max-attempts', type=int, default=2)
+    args = parser.parse_args()
+    if args.eta < 2:
+        parser.error('--eta must be at least 2')
+
+    os.makedirs(args.jobs_dir, exist_ok=True)
+    scen_paths = [scen_path for scen_dir in args.scen_dirs
+                  for scen_path in sorted(glob.glob(os.path.join(args.working_dir, scen_dir, '*')))]
+    instances = shuffled_instances(scen_paths, args.agents, args.seed)
+    if not instances:
+        parser.error('No scenario has enough agents')
+    instance_names = [f'{os.path.basename(os.path.dirname(scen_path))}-{os.path.basename(scen_path)}-{agents}'
+                      for scen_path, agents in instances]
+    all_configurations = configurations(args.params)
+    print(f'{len(all_configurations)} configurations, {len(instances)} instances')
+
+    def job(configuration, instance, instance_name):
+        scen_path, agents = instance
+        job_id = f'{configuration_id(configuration)}-{instance_name}'
+        return (job_id, os.path.join(args.jobs_dir, job_id + '.csv'), {
+            'command': shlex.split(args.solver) + ['--config', configuration], 'working_dir': args.working_dir,
+            'scen_path': os.path.relpath(scen_path, args.working_dir), 'num_agents': agents,
+            'log_path': os.path.join(args.jobs_dir, job_id + '.log'),
+            'cpu_limit': args.cpu_limit,
+            'memory_limit': args.memory_limit * 1024 * 1024 if args.memory_limit is not None else None,
+        }, None, None)
+
+    ledger = JobLedger(os.path.join(args.jobs_dir, 'ledger.sqlite'))
+    alive = all_configurations
+    rungs = []
+    cpu_times = []
+    rung = 0
+    try:
+        while True:
+            num_instances = min(args.budget * args.eta ** rung, len(instances))
+            jobs = [[job(configuration, instance, name)
+                     for instance, name in zip(instances[:num_instances], instance_names[:num_instances])]
+                    for configuration in alive]
+            ledger.add(itertools.chain.from_iterable(jobs))
+            counts = run(ledger, run_configuration, args.jobs, args.max_attempts)
+            if counts['failed']:
+                for job_id, attempts, error in ledger.failures():
+                    print(f'{job_id} failed {attempts} times: {error}')
+                print(f'Rung {rung} has failed jobs - fix them and run again to resume')
+                return
+
+            penalized = {}
+            solved_counts = {}
+            error_counts = {}
+            for configuration, configuration_jobs in zip(alive, jobs):
+                runs = [read_run(output_path, params['log_path'])
+                        for _, output_path, params, _, _ in configuration_jobs]
+                solved = np.array([solved for solved, _, _, _ in runs])
+                runtimes = np.array([runtime for _, runtime, _, _ in runs])
+                penalized[configuration] = np.where(solved, runtimes, args.penalty * args.time_limit)
+                solved_counts[configuration] = int(solved.sum())
+                error_counts[configuration] = sum(crashed for _, _, _, crashed in runs)
+                cpu_times += [(configuration, name, cpu_time)
+                              for name, (_, _, cpu_time, _) in zip(instance_names, runs)]
+            scores = rank(pd.DataFrame(penalized, index=instance_names[:num_instances]), args.eta, args.alpha)
+            scores.insert(0, 'Errors', pd.Series(error_counts)[scores.index])
+            scores.insert(0, 'Success Rate', pd.Series(solved_counts)[scores.index] / num_instances)
+            scores.index.name = 'Configuration'
+            scores = scores.reset_index()
+            scores.insert(0, 'Instances', num_instances)
+            scores.insert(0, 'Rung', rung)
+            rungs.append(scores)
+            print(f'\nRung {rung}: {len(alive)} configurations on {num_instances} instances')
+            with pd.option_context('display.width', 200, 'display.max_colwidth', None, 'display.max_rows', None):
+                print(scores.drop(columns=['Rung', 'Instances']).to_string(index=False, float_format='{:.3f}'.format))
+
+            alive = list(scores['Configuration'][scores['Kept']])
+            if len(alive) == 1 or num_instances == len(instances):
+                break
+            rung += 1
+    except KeyboardInterrupt:
+        print('Interrupted - run again to resume')
+        return
+    finally:
+        ledger.close()
+        if rungs:
+            pd.concat(rungs).to_csv(os.path.join(args.jobs_dir, 'rungs.csv'), index=False)
+
+    best = alive[0]
+    print(f'\nBest configuration: {best}')
+    print(f'Run it with: {args.solver} --scen <scenario> --agents <number> --results <csv> '
+          f'--config {shlex.quote(best)}')
+    # The same run may be counted by more than one rung
+    runs = pd.DataFrame(cpu_times, columns=['Configuration', 'Instance', 'CPU Time']).drop_duplicates(
+        ['Configuration', 'Instance'])
+    full_grid_runs = len(all_configurations) * len(instances)
+    cpu_time = runs['CPU Time'].sum()
+    print(f'Made {len(runs)} of the {full_grid_runs} runs of a full grid ({len(runs) / full_grid_runs:.1%}), '
+          f'using {cpu_time:.1f} seconds of CPU time')
+    if runs['CPU Time'].notna().any():
+        full_grid_cpu_time = runs['CPU Time'].mean() * full_grid_runs
+        print(f'A full grid would take about {full_grid_cpu_time:.1f} seconds of CPU time - '
+              f'the sweep used {cpu_time / full_grid_cpu_time:.1%} of it')
+
+
+if __name__ == '__main__':
+    main()
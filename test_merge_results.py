@@ -0,0 +1,52 @@
+from merge_results import merge
+from results_cache import irrelevant
+
+instance_columns = ['Grid Name', 'Grid Rows', 'Grid Columns', 'Instance Name', 'Num Of Agents', 'Num Of Obstacles',
+                    'Instance Id']
+solver_names = ['CBS(5)', 'CBS(10)']
+# Like CBS.OutputStatisticsHeader, every CBS block has its low level solver's columns, named after the low level solver
+low_level_columns = ['A*+OD/SIC Expanded', 'A*+OD/SIC Generated', 'A*+OD/SIC Expanded']
+
+
+def block_header(solver):
+    return ([f'{solver} {name}' for name in ['Success', 'Runtime', 'Solution Cost', 'Expanded (HL)']] +
+            low_level_columns + [f'{solver} Solution Depth'])
+
+
+def results_lines(solvers, num_rows=5):
+    header = instance_columns + [fieldname for solver in solvers for fieldname in block_header(solver)]
+    lines = [','.join(header) + ',']
+    for i in range(num_rows):
+        row = ['den520d', '256', '257', f'den520d-random-{i}.scen', str(10 + i), '100', str(i)]
+        for solver in solvers:
+            j = solver_names.index(solver)
+            if solver == 'CBS(10)' and i == 3:
+                row += ['0'] + [irrelevant] * (len(block_header(solver)) - 1)
+            else:
+                row += ['1', f'{100 * j + i}.5', str(50 + i)] + [str(1000 * j + 10 * i + k) for k in range(4)] + ['7']
+        lines.append(','.join(row) + ',')
+    return '\n'.join(lines) + '\n'
+
+
+def test_merging_a_file_with_itself_reproduces_it(tmp_path):
+    path = tmp_path / 'Results.csv'
+    path.write_text(results_lines(solver_names))
+    output_path = tmp_path / 'merged.csv'
+
+    num_rows_read, num_rows_written = merge([str(path), str(path)], str(output_path))
+
+    assert (num_rows_read, num_rows_written) == (10, 5)
+    assert output_path.read_text() == path.read_text()
+
+
+def test_merging_a_file_split_by_solver_reproduces_it(tmp_path):
+    path = tmp_path / 'Results.csv'
+    path.write_text(results_lines(solver_names))
+    first, second = tmp_path / 'CBS(5).csv', tmp_path / 'CBS(10).csv'
+    first.write_text(results_lines(['CBS(5)']))
+    second.write_text(results_lines(['CBS(10)']))
+    output_path = tmp_path / 'merged.csv'
+
+    merge([str(first), str(second)], str(output_path))
+
+    assert output_path.read_text() == path.read_text()
@@ -0,0 +1,36 @@
+import os
+
+from scheduler import JobLedger, run, DONE, FAILED, SKIPPED
+
+
+def failing_worker(params, output_path):
+    if params['fail']:
+        raise RuntimeError('solver crashed')
+    with open(output_path, 'w') as f:
+        f.write('solved')
+    return True
+
+
+def censor(params, output_path):
+    with open(output_path, 'w') as f:
+        f.write('censored')
+
+
+def test_a_level_where_every_job_failed_skips_the_harder_levels(tmp_path):
+    ledger = JobLedger(str(tmp_path / 'ledger.sqlite'))
+    jobs = []
+    for level in (1, 2, 3):
+        for i in range(2):
+            job_id = f'map-{level}-{i}'
+            jobs.append((job_id, str(tmp_path / f'{job_id}.txt'), {'fail': level == 2}, 'map', level))
+    ledger.add(jobs)
+
+    counts = run(ledger, failing_worker, processes=2, max_attempts=1, min_success_rate=0.5, censor=censor)
+
+    assert counts == {DONE: 2, FAILED: 2, SKIPPED: 2}
+    assert ledger.levels('map', 1) == [(1, 2, 2, 0), (2, 2, 0, 0), (3, 2, 0, 0)]
+    for i in range(2):
+        with open(tmp_path / f'map-3-{i}.txt') as f:
+            assert f.read() == 'censored'
+    assert not os.path.exists(tmp_path / 'map-2-0.txt')
+    ledger.close()
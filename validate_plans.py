@@ -0,0 +1,249 @@
+"""
+Check the solutions the solvers print, independently of the solvers that found them.
+
+Usage: validate_plans.py output.log ... [--instances-dir ../../../Instances] [-o plans.csv] [--violations v.csv]
+
+Plans are read from the console output of Run.cs, where Plan.PrintPlan prints a line per timestep with the
+location of every agent, "|(x,y)|(x,y)|...|", after the solver's name and reported cost. Each plan is parsed into
+a (timesteps x agents) array of locations and checked with a few array operations over all of it:
+- vertex conflicts: two agents in the same cell at the same time,
+- edge conflicts: two agents traversing the same edge in the same timestep, called swaps when they traverse it
+  in opposite directions,
+- jumps: moves to a cell that isn't next to the previous one,
+- obstacle collisions and locations outside the grid, and starts and goals other than the instance's, when the
+  instance's file is found.
+The sum of costs and the makespan are recomputed like SinglePlan.GetCost - an agent's cost is the time of its last
+move - and the sum of costs is compared with the reported one.
+
+PrintPlanIfShort doesn't print long or wide plans, so enlarge its limits or call PrintPlan to check every plan.
+Plans that weren't printed are counted, not checked. The exit status is 1 if any plan is invalid.
+"""
+import os
+import re
+import argparse
+import functools
+import multiprocessing
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from maps import OBSTACLE
+from instance_features import load_instance_file
+
+PlanRecord = namedtuple('PlanRecord', ['instance_name', 'num_agents', 'solver', 'reported_cost', 'reported_makespan',
+                                       'locations'])
+summary_fieldnames = ['Output', 'Plan', 'Instance Name', 'Num Of Agents', 'Solver', 'Printed', 'Instance Found',
+                      'Reported Cost', 'Reported Makespan', 'Timesteps', 'Sum Of Costs', 'Makespan', 'Violations']
+violation_fieldnames = ['Kind', 'Time', 'Agent', 'Other Agent', 'X', 'Y']
+
+_instance_pattern = re.compile(r'Solving Problem instance name:(.*) #Agents:(\d+),')
+_solver_pattern = re.compile(r'^-{17}(.*)-{17}$')
+_digits = str.maketrans('|(),', '    ')
+
+
+def parse_plan(lines):
+    """A (timesteps x agents x 2) array of the (x, y) locations in the given lines that Plan.PrintPlan printed"""
+    num_agents = lines[0].count('(')
+    values = np.fromstring(''.join(lines).translate(_digits), dtype=np.int32, sep=' ')
+    if len(values) != len(lines) * num_agents * 2:
+        raise ValueError('plan lines have different numbers of agents')
+    return values.reshape(len(lines), num_agents, 2)
+
+
+def read_plans(path):
+    """Yield a PlanRecord for every plan in a Run.cs output, with None locations for plans that weren't printed"""
+    instance_name = solver = None
+    num_agents = reported_cost = reported_makespan = None
+    plan_lines = []
+    with open(path, errors='replace') as f:
+        for line in f:
+            if line.startswith('|('):
+                plan_lines.append(line)
+                continue
+            if plan_lines:
+                yield PlanRecord(instance_name, num_agents, solver, reported_cost, reported_makespan,
+                                 parse_plan(plan_lines))
+                plan_lines = []
+            line = line.rstrip('\r\n')
+            if line.startswith('Solving '):
+                match = _instance_pattern.match(line)
+                if match is not None:
+                    instance_name, num_agents = match[1], int(match[2])
+            elif line.startswith('Total cost: '):
+                reported_cost = int(line.split(':')[1])
+            elif line.startswith('Makespan: '):
+                reported_makespan = int(line.split(':')[1])
+            elif line.startswith('Plan is too '):
+                yield PlanRecord(instance_name, num_agents, solver, reported_cost, reported_makespan, None)
+            else:
+                match = _solver_pattern.match(line)
+                if match is not None:
+                    solver, reported_cost, reported_makespan = match[1], None, None
+    if plan_lines:
+        yield PlanRecord(instance_name, num_agents, solver, reported_cost, reported_makespan, parse_plan(plan_lines))
+
+
+def _same_value_pairs(keys):
+    """
+    The (row, column, other column) indices of the columns with the same key in a row of a 2D array. Of more than
+    two columns with the same key, each is paired with the next one. Only the rows that have such columns are
+    argsorted - a plain sort finds them faster.
+    """
+    sorted_keys = np.sort(keys, axis=1)
+    rows = np.flatnonzero((sorted_keys[:, 1:] == sorted_keys[:, :-1]).any(axis=1))
+    order = np.argsort(keys[rows], axis=1, kind='stable')
+    sorted_keys = np.take_along_axis(keys[rows], order, axis=1)
+    indices, columns = np.nonzero(sorted_keys[:, 1:] == sorted_keys[:, :-1])
+    return rows[indices], order[indices, columns], order[indices, columns + 1]
+
+
+def agent_costs(locations, free_goal_waits=False):
+    """
+    The cost of each agent's plan, the time of its last move. With free_goal_waits, like the
+    WAITING_AT_GOAL_ALWAYS_FREE sum of costs variant, the number of its steps that aren't waits at its goal.
+    """
+    moved = (locations[1:] != locations[:-1]).any(axis=2)
+    if free_goal_waits:
+        at_goal = (locations[1:] == locations[-1]).all(axis=2)
+        return (moved | ~at_goal).sum(axis=0)
+    last_moves = len(moved) - np.argmax(moved[::-1], axis=0)
+    return np.where(moved.any(axis=0), last_moves, 0)
+
+
+def check_plan(locations, grid=None, agents=None):
+    """
+    The violations of a (timesteps x agents x 2) plan, as a DataFrame with violation_fieldnames columns.
+    grid is the instance's grid and agents its maps.Instance agents array, if known, with an agent per plan column.
+    """
+    locations = np.asarray(locations, dtype=np.int32)
+    num_times, num_agents, _ = locations.shape
+    x, y = np.ascontiguousarray(locations[:, :, 0]), np.ascontiguousarray(locations[:, :, 1])
+    found = [(np.empty(0, dtype=object), *np.empty((3, 0), dtype=np.int64))]  # (kinds, times, agents, others)
+
+    def add(kind, times, violating, others=-1):
+        found.append((np.broadcast_to(kind, times.shape), times, violating, np.broadcast_to(others, times.shape)))
+
+    if grid is not None:
+        rows, columns = grid.shape
+        outside = (x < 0) | (x >= rows) | (y < 0) | (y >= columns)
+        blocked = ~outside & (np.asarray(grid)[np.clip(x, 0, rows - 1), np.clip(y, 0, columns - 1)] == OBSTACLE)
+        add('outside', *np.nonzero(outside))
+        add('obstacle', *np.nonzero(blocked))
+    if agents is not None:
+        for kind, time, location_columns in (('start', 0, [3, 4]), ('goal', num_times - 1, [1, 2])):
+            violating = np.flatnonzero((locations[time] != agents[:, location_columns]).any(axis=1))
+            add(kind, np.full(len(violating), time), violating)
+
+    if locations.size:
+        # A unique number for every location, including those outside the grid
+        low_x, low_y = x.min(), y.min()
+        width = y.max() - low_y + 1
+        if (int(x.max()) - low_x + 1) * int(width) > np.iinfo(np.int32).max:
+            x, y = x.astype(np.int64), y.astype(np.int64)
+        cells = (x - low_x) * width + (y - low_y)
+        add('vertex', *_same_value_pairs(cells))
+
+        times, jumping = np.nonzero(np.abs(x[1:] - x[:-1]) + np.abs(y[1:] - y[:-1]) > 1)
+        add('jump', times + 1, jumping)
+
+        # Every traversed edge gets a key that's the same in both directions. Waits get unique negative keys.
+        num_cells = np.int64(cells.max()) + 1
+        sources, targets = cells[:-1], cells[1:]
+        edges = np.where(sources != targets, np.minimum(sources, targets) * num_cells + np.maximum(sources, targets),
+                         -1 - np.arange(num_agents, dtype=np.int64))
+        times, first, second = _same_value_pairs(edges)
+        add(np.where(sources[times, first] == targets[times, second], 'swap', 'edge'), times + 1, first, second)
+
+    kinds, times, violating, others = (np.concatenate(arrays) for arrays in zip(*found))
+    violations = pd.DataFrame({'Kind': kinds, 'Time': times, 'Agent': violating, 'Other Agent': others,
+                               'X': x[times, violating], 'Y': y[times, violating]}, columns=violation_fieldnames)
+    return violations.sort_values(['Time', 'Kind', 'Agent'], kind='stable', ignore_index=True)
+
+
+@functools.lru_cache(maxsize=64)
+def _instance(path, num_agents, maps_dir):
+    return load_instance_file(path, num_agents, maps_dir)
+
+
+def check_log(path, instances_dir=None, maps_dir=None, free_goal_waits=False):
+    """The summary of every plan in a Run.cs output and the violations found in them, as two DataFrames"""
+    rows, violations = [], []
+    for number, record in enumerate(read_plans(path)):
+        row = {'Output': path, 'Plan': number, 'Instance Name': record.instance_name,
+               'Num Of Agents': record.num_agents, 'Solver': record.solver, 'Printed': record.locations is not None,
+               'Instance Found': False, 'Reported Cost': record.reported_cost,
+               'Reported Makespan': record.reported_makespan}
+        rows.append(row)
+        if record.locations is None:
+            continue
+        instance = None
+        if instances_dir is not None and record.instance_name is not None:
+            try:
+                instance = _instance(os.path.join(instances_dir, record.instance_name), record.num_agents, maps_dir)
+            except (OSError, ValueError, IndexError, StopIteration) as e:
+                print(f"Can't check {record.instance_name} against its instance - {e}")
+        agents_match = instance is not None and len(instance.agents) == record.locations.shape[1]
+        plan_violations = check_plan(record.locations, *((instance.grid, instance.agents) if agents_match else ()))
+        if instance is not None and not agents_match:  # With the plan's and the instance's numbers of agents
+            plan_violations.loc[len(plan_violations)] = ['agents', -1, record.locations.shape[1], len(instance.agents),
+                                                         -1, -1]
+        costs = agent_costs(record.locations, free_goal_waits)
+        row.update({'Instance Found': instance is not None, 'Timesteps': len(record.locations),
+                    'Sum Of Costs': int(costs.sum()), 'Makespan': int(costs.max()) if len(costs) else 0,
+                    'Violations': len(plan_violations)})
+        if record.reported_cost is not None and record.reported_cost != row['Sum Of Costs']:  # X, Y: reported, actual
+            plan_violations.loc[len(plan_violations)] = ['cost', -1, -1, -1, record.reported_cost, row['Sum Of Costs']]
+            row['Violations'] += 1
+        plan_violations.insert(0, 'Plan', number)
+        plan_violations.insert(0, 'Output', path)
+        violations.append(plan_violations)
+    summary = pd.DataFrame(rows, columns=summary_fieldnames)
+    summary[summary_fieldnames[-6:]] = summary[summary_fieldnames[-6:]].astype('Int64')  # Missing if not printed
+    return summary, (pd.concat(violations, ignore_index=True) if violations else
+                     pd.DataFrame(columns=['Output', 'Plan'] + violation_fieldnames))
+
+
+def _check_log(args):
+    return check_log(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the plans in Run.cs outputs for conflicts and wrong costs')
+    parser.add_argument('outputs', nargs='+', help='Console outputs of Run.cs with printed plans')
+    parser.add_argument('--instances-dir', default=None,
+                        help='Where the instance files are, to also check obstacles, starts and goals')
+    parser.add_argument('--maps-dir', default=None, help='Where the maps of .scen files are (default: like Import)')
+    parser.add_argument('--free-goal-waits', action='store_true',
+                        help='Costs are of the WAITING_AT_GOAL_ALWAYS_FREE sum of costs variant')
+    parser.add_argument('-o', '--output', default=None, help='A CSV to write a row per plan to')
+    parser.add_argument('--violations', default=None, help='A CSV to write a row per violation to')
+    parser.add_argument('--jobs', type=int, default=None, help='Parallel processes (default: one per output file)')
+    args = parser.parse_args()
+
+    tasks = [(path, args.instances_dir, args.maps_dir, args.free_goal_waits) for path in args.outputs]
+    processes = args.jobs if args.jobs is not None else min(len(tasks), os.cpu_count())
+    if processes <= 1:
+        results = list(map(_check_log, tasks))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_check_log, tasks)
+    summary = pd.concat([plans for plans, _ in results], ignore_index=True)
+    violations = pd.concat([found for _, found in results], ignore_index=True)
+    if args.output is not None:
+        summary.to_csv(args.output, index=False)
+    if args.violations is not None:
+        violations.to_csv(args.violations, index=False)
+
+    checked = summary[summary['Printed'].astype(bool)]
+    invalid = checked[checked['Violations'] > 0]
+    print(f'{len(summary)} plans, {len(checked)} printed and checked, {len(invalid)} invalid')
+    if not violations.empty:
+        print(violations.groupby('Kind').size().to_string())
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(invalid[['Output', 'Plan', 'Instance Name', 'Solver', 'Violations']].to_string(index=False))
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()